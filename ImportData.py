@@ -10,6 +10,8 @@ import os
 import pandas as pd
 import glob
 
+from signals import signalState, decodeSignals
+
 from plotly.offline import plot
 import plotly.graph_objs as go
 
@@ -79,52 +81,25 @@ class Data:
     
     def stratMA(self, df):
         
-        df['signal_ma'] = None
-        buy_auto = True
-        
-        for i in range(len(df)):
-            
-            if (buy_auto == True) & (df['20_sma'].iloc[i] > df['50_sma'].iloc[i]):
-                buy_auto = False
-                df['signal_ma'].iloc[i] = "buy"
-               
-            if (buy_auto == False) & (df['20_sma'].iloc[i] < df['50_sma'].iloc[i]):
-                buy_auto = True
-                df['signal_ma'].iloc[i] = "sell"
+        entry = df['20_sma'].values > df['50_sma'].values
+        exit = df['20_sma'].values < df['50_sma'].values
+        df['signal_ma'] = decodeSignals(signalState(entry, exit))
                 
         return df
     
     def stratBO(self, df):
         
-        df['signal_bo'] = None
-        buy_auto = True
-        
-        for i in range(len(df)):
-            
-            if (buy_auto == True) & (df['low_boll'].iloc[i] > df['Close'].iloc[i]):
-                buy_auto = False
-                df['signal_bo'].iloc[i] = "buy"
-               
-            if (buy_auto == False) & ((df['high_boll'].iloc[i] < df['Close'].iloc[i])):
-                buy_auto = True
-                df['signal_bo'].iloc[i] = "sell"
+        entry = df['low_boll'].values > df['Close'].values
+        exit = df['high_boll'].values < df['Close'].values
+        df['signal_bo'] = decodeSignals(signalState(entry, exit))
                 
         return df
     
     def stratRSI(self, df):
         
-        df['signal_rsi'] = None
-        buy_auto = True
-        
-        for i in range(len(df)):
-            
-            if (buy_auto == True) & (df['rsi'].iloc[i] < 40):
-                buy_auto = False
-                df['signal_rsi'].iloc[i] = "buy"
-               
-            if (buy_auto == False) & (df['rsi'].iloc[i] > 60):
-                buy_auto = True
-                df['signal_rsi'].iloc[i] = "sell"
+        entry = df['rsi'].values < 40
+        exit = df['rsi'].values > 60
+        df['signal_rsi'] = decodeSignals(signalState(entry, exit))
                 
         return df
     
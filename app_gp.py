@@ -1,14 +1,28 @@
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+import dash_table
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
 from datetime import datetime as dt
+from functools import lru_cache
 from plotly.subplots import make_subplots
 
+import logging
+import numpy as np
+import os
+import threading
+import time
 
-import pandas as pd
-
-from code2 import main as core_analysis
+from code2 import Data, OVERLAY_TRACES, STRATEGY_NAMES, main as core_analysis
+from live import LiveFeed, extendUpdate, liveFigure
+from downsample import browserData, buildPyramid, chooseLevel, lttb, visibleRange, window
+from screener import DERIVED_COLUMNS, SCREENER_FILE, SCREENS, ScreenerIndex, filterQuery, parseFilterQuery
+from shared import SHARED_DIR, SharedCache
+from snapshot import Snapshot
+import instrument
+import flask
+from store import Store
 
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
@@ -17,13 +31,138 @@ app = dash.Dash(
     __name__, meta_tags=[{"name": "viewport", "content": "width=device-width"}]
 )
 
-df = pd.read_csv('https://plotly.github.io/datasets/country_indicators.csv')
+data = Data()
+
+#number of per-ticker figures kept in memory
+FIGURE_CACHE_SIZE = 16
+#maximum number of candles / points per line sent for one chart
+MAX_POINTS = 2000
+#seconds between two refreshes of the data, and before retrying a failed one
+REFRESH_INTERVAL = int(os.environ.get('REFRESH_INTERVAL', 6 * 3600))
+RETRY_DELAY = 300
+
+#frames kept compact in memory (float32 indicators, int8 signals), and with
+#float32 prices too when COMPACT_PRICES is set
+COMPACT = os.environ.get('COMPACT', '1') not in ('', '0')
+COMPACT_PRICES = os.environ.get('COMPACT_PRICES', '0') not in ('', '0')
+
+#live mode : simulated bars pushed every LIVE_INTERVAL seconds and appended
+#to the live chart with extendData
+LIVE = os.environ.get('LIVE', '0') not in ('', '0')
+LIVE_INTERVAL = float(os.environ.get('LIVE_INTERVAL', 1))
+
+#clientside mode : the data of every ticker is sent once to the browser and
+#the chart is built there (assets/charts.js) when the ticker or strategies
+#change. WEBGL draws the overlay lines of the server figures with Scattergl
+CLIENTSIDE = os.environ.get('CLIENTSIDE', '0') not in ('', '0')
+WEBGL = os.environ.get('WEBGL', '1') not in ('', '0')
+
+#shared mode, for several worker processes (gunicorn app_gp:server -w 4) :
+#one worker refreshes the data and publishes the frames, results and figures
+#in the shared cache (shared.py), every worker attaches to the last published
+#version, checked every SHARED_POLL seconds
+SHARED = os.environ.get('SHARED', '0') not in ('', '0')
+SHARED_POLL = 5
+shared = SharedCache(os.path.join(data.data_dir, SHARED_DIR)) if SHARED else None
+attached = shared.attach() if SHARED else None
+
+#results of the last refresh, the app starts from the persisted one and the
+#background refresh replaces it (None until a first refresh has succeeded)
+if attached is not None:
+    snapshot = attached.snapshot
+else:
+    snapshot = Snapshot.load(data.store, compact=COMPACT, lazy=SHARED, prices32=COMPACT_PRICES)
+
+#columns of the screener table
+SCREENER_COLUMNS = {
+    'ticker': "Ticker",
+    'Date': "Last bar",
+    'Close': "Close",
+    'rsi': "RSI",
+    '20_sma': "20 SMA",
+    '50_sma': "50 SMA",
+    'low_boll': "Lower band",
+    'high_boll': "Upper band",
+    'signal_bo': "bollinger open",
+    'signal_ma': "moving average open",
+    'signal_rsi': "rsi open",
+}
+
+
+# Screener index saved by the last refresh, built from the snapshot frames
+# when there is none yet
+def load_screener():
+    index = ScreenerIndex.load(os.path.join(data.data_dir, SCREENER_FILE))
+    if not len(index) and snapshot:
+        for ticker in snapshot.tickers:
+            index.updateFrame(ticker, snapshot.frames[ticker])
+    return index
+
+
+screener = attached.screener if attached is not None else load_screener()
+
+
+# Shared mode : switches to the version last published by any worker
+def follow_shared():
+    global attached, snapshot, screener
+    version = shared.current()
+    if version is not None and (attached is None or attached.version != version):
+        attached = shared.attach(version)
+        snapshot = attached.snapshot
+        screener = feed.screener = attached.screener
+
+
+# Shared mode : publishes the snapshot of this worker with the figure of
+# every ticker, and attaches to it like the other workers
+def publish_snapshot():
+    version = shared.publish(
+        snapshot, screener,
+        figures=lambda ticker: ticker_figure(ticker, snapshot.updated).to_json(),
+        browser=browser_data(snapshot.updated) if CLIENTSIDE else None)
+    follow_shared()
+    return version
 
 
+def refresh_loop():
+    global snapshot, screener
+    while True:
+        if SHARED:
+            follow_shared()
+            #only the worker holding the lock refreshes
+            if not shared.tryLock():
+                time.sleep(SHARED_POLL)
+                continue
+            if attached is None and snapshot is not None:
+                publish_snapshot()
+        age = (dt.now() - snapshot.updated).total_seconds() if snapshot else REFRESH_INTERVAL
+        if age < REFRESH_INTERVAL:
+            time.sleep(min(REFRESH_INTERVAL - age, SHARED_POLL) if SHARED else REFRESH_INTERVAL - age)
+            continue
+        try:
+            core_analysis(buildFigure=False, compact=COMPACT)
+            snapshot = Snapshot.load(Store(data.data_dir), compact=COMPACT, prices32=COMPACT_PRICES)
+            screener = feed.screener = load_screener()
+            if SHARED:
+                publish_snapshot()
+        except Exception:
+            logging.exception("refresh of the data failed")
+            time.sleep(RETRY_DELAY)
 
-tickers, liste_df, liste_returns, figure = core_analysis()
 
-available_indicators = df['Indicator Name'].unique()
+feed = LiveFeed(data, LIVE_INTERVAL, screener=screener)
+if LIVE:
+    feed.start()
+
+
+# Per-stage timings and memory peaks (instrument.py, enabled with INSTRUMENT=1)
+@app.server.route('/metrics')
+def metrics_prometheus():
+    return flask.Response(instrument.metrics.toPrometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.server.route('/metrics.json')
+def metrics_json():
+    return flask.jsonify(enabled=instrument.ENABLED, spans=instrument.metrics.toJson())
 
 
 # Returns Top cell bar for header area
@@ -40,15 +179,38 @@ def get_top_bar_cell(cellTitle, cellValue):
 
 # Returns HTML Top Bar for app layout
 def get_top_bar(
-    sharpe=3.432, returns=6577, volatility=32.112, time_day = str(dt.today())[:16]
+    sharpe='-', returns='-', volatility='-', time_day = None
 ):
+    # time_day defaults to the date of the newest bar shown, with the time
+    # of the refresh that stored it
+    if time_day is None:
+        last = snapshot.lastDate if snapshot else None
+        time_day = (f"{str(last)[:16]} (refreshed {str(snapshot.updated)[:16]})"
+                    if last is not None else 'no data yet')
     return [
-        #get_top_bar_cell("Sharpe", sharpe),
-        #get_top_bar_cell("Return", returns),
-        #get_top_bar_cell("Volatility", volatility),
+        get_top_bar_cell("Sharpe", sharpe),
+        get_top_bar_cell("Return", returns),
+        get_top_bar_cell("Volatility", volatility),
         get_top_bar_cell("Last Date", time_day)
     ]
 
+# Top bar of a ticker, with the metrics of its best strategy computed
+# during the refresh
+def ticker_top_bar(ticker):
+    metrics = snapshot.metrics.get(ticker) if snapshot else None
+    if not metrics:
+        return get_top_bar()
+    strategy = max(metrics, key=lambda s: -np.inf if np.isnan(metrics[s]['return']) else metrics[s]['return'])
+    best = metrics[strategy]
+    return get_top_bar(
+        sharpe=f"{best['sharpe']:.2f} ({strategy})",
+        returns=f"{best['return']:.1%}",
+        volatility=f"{best['volatility']:.1%}",
+    )
+
+def ticker_options():
+    return [{'label' : i, 'value' : i} for i in (snapshot.tickers if snapshot else [])]
+
 assets = ['BTC','ETH','XRP']
 strategies = ['moving average', 'boolinger bands', 'RSI', 'other']
 
@@ -95,6 +257,20 @@ def chart_div(pair):
 
 
 
+# Data of every ticker for the clientside charts, built once per snapshot
+@lru_cache(maxsize=1)
+def browser_data(version):
+    if attached is not None and attached.snapshot.updated == version:
+        published = attached.browser()
+        if published is not None:
+            return published
+    return {
+        'version': str(version),
+        'tickers': {ticker: browserData(snapshot.frames[ticker], snapshot.returns[ticker], STRATEGY_NAMES)
+                    for ticker in snapshot.tickers},
+    }
+
+
 app.layout = html.Div([
     html.Div(
         className="three columns div-left-panel",
@@ -151,15 +327,6 @@ app.layout = html.Div([
 #             ),
 #             html.Div([
 #                 dcc.Dropdown(
-#                     id = "asset",
-#                     options = [{'label' : i, 'value' : i} for i in tickers],
-#                     value = 'BTC_USD'
-#                 )
-#             ],
-#             style = {'width' : '16%', 'display' : 'inline-block'}
-#             ),
-#             html.Div([
-#                 dcc.Dropdown(
 #                     id = "strategies",
 #                     options = [{'label' : i, 'value' : i} for i in strategies],
 #                     value = 'moving average'
@@ -167,6 +334,27 @@ app.layout = html.Div([
 #             ],
 #             style = {'width' : '20%', 'display' : 'inline-block'}
 #             ),
+            html.Div([
+                dcc.Dropdown(
+                    id = "asset",
+                    options = ticker_options(),
+                    value = snapshot.tickers[0] if snapshot and snapshot.tickers else None,
+                    clearable = False
+                )
+            ],
+            style = {'width' : '16%', 'display' : 'inline-block'}
+            ),
+            html.Div([
+                dcc.Checklist(
+                    id = "strategy_toggle",
+                    options = [{'label' : i, 'value' : i} for i in STRATEGY_NAMES.values()],
+                    value = list(STRATEGY_NAMES.values()),
+                    labelStyle = {'display' : 'inline-block'}
+                )
+            ],
+            style = {'display' : 'inline-block' if CLIENTSIDE else 'none'}
+            ),
+            dcc.Store(id="ticker_data", data=browser_data(snapshot.updated) if CLIENTSIDE and snapshot else None),
             html.Div(
                     id="charts",
                     className="row",
@@ -174,25 +362,174 @@ app.layout = html.Div([
                         html.Div(
                             dcc.Graph(
                                 id='pair' + "chart",
-                                figure = {
-                                    "data" : figure.data,
-                                    "layout" : figure.layout}
                             )
                         )
                     ]
             ),
+            html.Div(
+                    id="live",
+                    className="row",
+                    style={} if LIVE else {"display": "none"},
+                    children=[
+                        dcc.Graph(id="livechart"),
+                        dcc.Store(id="live_seq"),
+                        dcc.Interval(id="live_interval", interval=LIVE_INTERVAL * 1000, disabled=not LIVE),
+                    ]
+            ),
             html.Div(
                         id='update_date',
                         className='row div-top-bar',
                         children=get_top_bar()
                         ),
+            html.Div(
+                    id="screener_div",
+                    className="row",
+                    children=[
+                        dcc.Dropdown(
+                            id = "screen",
+                            options = [{'label' : i, 'value' : i} for i in SCREENS],
+                            placeholder = "Screen the universe"
+                        ),
+                        dash_table.DataTable(
+                            id="screener",
+                            columns=[{'name': name, 'id': col} for col, name in SCREENER_COLUMNS.items()],
+                            filter_action='custom',
+                            filter_query='',
+                            sort_action='custom',
+                            sort_mode='single',
+                            sort_by=[],
+                            page_size=20,
+                            style_header={'backgroundColor': 'rgb(30, 30, 30)'},
+                            style_cell={'backgroundColor': 'rgb(17, 17, 17)', 'color': '#f2f5fa'},
+                        ),
+                    ]
+            ),
         ]
     ),
     html.Div(id="orders", style={"display": "none"}),
+    dcc.Interval(id="refresh_interval", interval=60 * 1000),
 
 ])
 
 
 
+# Weekly / monthly / quarterly bars of a ticker, built once per snapshot
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def ticker_pyramid(ticker, version):
+    return buildPyramid(snapshot.frames[ticker])
+
+
+# Builds the figure of one ticker for a visible range, the coarsest level
+# that fits the range is used so the number of points stays bounded.
+# The last ones are kept in a LRU cache
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def ticker_figure(ticker, version, start=None, end=None):
+    #the whole history of a published version is read from the shared cache
+    if start is None and attached is not None and attached.snapshot.updated == version:
+        published = attached.figure(ticker)
+        if published is not None:
+            return published
+    pyramid = ticker_pyramid(ticker, version)
+    if start is not None:
+        #one visible width on each side so panning does not show empty space
+        margin = end - start
+        start, end = start - margin, end + margin
+    level, bars = chooseLevel(pyramid, start, end, MAX_POINTS)
+    daily = window(pyramid['D'], start, end)
+    overlays = {col: lttb(daily['Date'].values, daily[col].values, MAX_POINTS)
+                for col in OVERLAY_TRACES}
+    fig = data.tickerFigure(bars, snapshot.returns[ticker], ticker, overlays, gl=WEBGL)
+    fig.update_layout(uirevision=ticker)
+    return fig
+
+
+# Server chart of a ticker, redrawn for the visible range on zoom / pan
+def update_chart(ticker, relayout):
+    if snapshot is None or ticker not in snapshot.tickers:
+        return {}
+    #a new ticker is shown in full, a zoom or pan keeps the ticker
+    triggered = [t['prop_id'] for t in dash.callback_context.triggered]
+    start, end = visibleRange(relayout)
+    if "asset.value" in triggered or start is None:
+        return ticker_figure(ticker, snapshot.updated)
+    return ticker_figure(ticker, snapshot.updated, start.floor('D'), end.ceil('D'))
+
+
+# Sends the data of a new refresh to the browser, nothing while it is unchanged
+def update_ticker_data(n_intervals, current):
+    if snapshot is None or (current and current.get('version') == str(snapshot.updated)):
+        raise PreventUpdate
+    return browser_data(snapshot.updated)
+
+
+if CLIENTSIDE:
+    app.callback(Output("ticker_data", "data"),
+                 [Input("refresh_interval", "n_intervals")],
+                 [State("ticker_data", "data")])(update_ticker_data)
+    app.clientside_callback(ClientsideFunction("charts", "tickerFigure"),
+                            Output('pair' + "chart", "figure"),
+                            [Input("asset", "value"), Input("strategy_toggle", "value"),
+                             Input("ticker_data", "data")])
+else:
+    app.callback(Output('pair' + "chart", "figure"),
+                 [Input("asset", "value"), Input('pair' + "chart", "relayoutData")])(update_chart)
+
+
+# Live chart : the whole figure when the ticker changes, then only the bars
+# pushed since the last update. The time from the arrival of a bar to its
+# update being sent is recorded in the metrics as live.latency
+@app.callback([Output("livechart", "figure"), Output("livechart", "extendData"), Output("live_seq", "data")],
+              [Input("asset", "value"), Input("live_interval", "n_intervals")],
+              [State("live_seq", "data")])
+def update_live(ticker, n_intervals, seen):
+    if not LIVE or snapshot is None or ticker not in snapshot.tickers:
+        raise PreventUpdate
+    live = feed.watch(ticker, snapshot.frames[ticker])
+    triggered = [t['prop_id'] for t in dash.callback_context.triggered]
+    if "asset.value" in triggered or not seen or seen.get('ticker') != ticker:
+        rows, seq = live.snapshot()
+        return liveFigure(rows, ticker), dash.no_update, {'ticker': ticker, 'seq': seq}
+    new, seq = live.since(seen['seq'])
+    if not new:
+        raise PreventUpdate
+    sent = time.perf_counter()
+    for arrival, _ in new:
+        instrument.metrics.record('live.latency', ticker, sent - arrival, 0)
+    return dash.no_update, extendUpdate([row for _, row in new]), {'ticker': ticker, 'seq': seq}
+
+
+# A ready made screen fills the filter of the screener table
+@app.callback(Output("screener", "filter_query"), [Input("screen", "value")])
+def update_screen(screen):
+    return filterQuery(SCREENS[screen]) if screen else ''
+
+
+# Rows of the screener table : the filter and sort of the table run on the
+# index, which follows the refreshes and the live bars
+@app.callback(Output("screener", "data"),
+              [Input("screener", "filter_query"), Input("screener", "sort_by"),
+               Input("refresh_interval", "n_intervals"), Input("live_interval", "n_intervals")])
+def update_screener(filter_query, sort_by, n_refresh, n_live):
+    filters = [f for f in parseFilterQuery(filter_query) if f[0] in SCREENER_COLUMNS or f[0] in DERIVED_COLUMNS]
+    sort = sort_by[0] if sort_by else {}
+    table = screener.query(filters, sort.get('column_id'), sort.get('direction') != 'desc')
+    table['Date'] = table['Date'].dt.strftime('%Y-%m-%d %H:%M')
+    table = table[list(SCREENER_COLUMNS)].round(4)
+    return table.astype(object).where(table.notnull(), None).to_dict('records')
+
+
+# Follows the background refresh: tickers available and freshness of the data
+@app.callback([Output("asset", "options"), Output('update_date', "children")],
+              [Input("refresh_interval", "n_intervals"), Input("asset", "value")])
+def update_refresh(n_intervals, ticker):
+    return ticker_options(), ticker_top_bar(ticker)
+
+
+#started once every function it uses is defined
+threading.Thread(target=refresh_loop, daemon=True).start()
+
+#WSGI application for the multi-worker deployment
+server = app.server
+
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
@@ -0,0 +1,118 @@
+/* Clientside rendering of the price chart (CLIENTSIDE=1 in app_gp.py).
+   The data of every ticker is held in the ticker_data store (see
+   browserData in downsample.py), so switching ticker or strategies builds
+   the figure in the browser without a request to the server. */
+
+var DAY = 86400000;
+
+var LINE_COLORS = {
+    "20 SMA": "rgba(102, 207, 255, 50)",
+    "50 SMA": "rgba(255, 207, 102, 50)",
+    "200 SMA": "rgba(207, 255, 102, 50)",
+    "Lower Bollinger Band": "rgba(50, 102, 255, 50)",
+    "High Bollinger Band": "rgba(50, 102, 255, 50)"
+};
+
+/* overlays drawn for each strategy, the 200 SMA is always drawn */
+var STRATEGY_LINES = {
+    "moving average": ["20 SMA", "50 SMA"],
+    "bollinger": ["Lower Bollinger Band", "High Bollinger Band"],
+    "rsi": []
+};
+
+function sma(close, window) {
+    /* mean of every full window without missing close, null elsewhere */
+    var out = new Array(close.length).fill(null);
+    var sum = 0, count = 0;
+    for (var i = 0; i < close.length; i++) {
+        if (close[i] !== null) { sum += close[i]; count++; }
+        if (i >= window && close[i - window] !== null) { sum -= close[i - window]; count--; }
+        if (i >= window - 1 && count === window) { out[i] = sum / window; }
+    }
+    return out;
+}
+
+function shift(values, offset) {
+    return values.map(function(v) { return v === null || offset === null ? null : v + offset; });
+}
+
+function pick(values, rows) {
+    return rows.map(function(i) { return values[i]; });
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    charts: {
+        tickerFigure: function(ticker, strategies, store) {
+            if (!store || !ticker || !store.tickers[ticker]) {
+                return {data: [], layout: {template: null}};
+            }
+            var d = store.tickers[ticker];
+            strategies = strategies || [];
+            var x = d.t.map(function(t) { return d.start + t * DAY; });
+            var sma50 = sma(d.c, 50);
+            var lines = {
+                "20 SMA": sma(d.c, 20),
+                "50 SMA": sma50,
+                "200 SMA": sma(d.c, 200),
+                "Lower Bollinger Band": shift(sma50, d.band === null ? null : -d.band),
+                "High Bollinger Band": shift(sma50, d.band)
+            };
+            var shown = {"200 SMA": true};
+            strategies.forEach(function(s) {
+                (STRATEGY_LINES[s] || []).forEach(function(name) { shown[name] = true; });
+            });
+
+            var data = [{
+                type: "candlestick", name: "Candlesticks", x: x,
+                open: d.o, high: d.h, low: d.l, close: d.c, xaxis: "x", yaxis: "y"
+            }];
+            Object.keys(lines).forEach(function(name) {
+                data.push({
+                    type: "scattergl", mode: "lines", name: name, x: x, y: lines[name],
+                    visible: shown[name] ? true : "legendonly",
+                    line: {color: LINE_COLORS[name]}, xaxis: "x", yaxis: "y"
+                });
+            });
+            strategies.forEach(function(s) {
+                var signals = d.signals[s];
+                if (!signals) { return; }
+                data.push({
+                    type: "scattergl", mode: "markers", name: s + " buy",
+                    x: pick(x, signals.buy), y: pick(d.l, signals.buy),
+                    marker: {symbol: "triangle-up", color: "rgb(0, 255, 0)", size: 9}, xaxis: "x", yaxis: "y"
+                });
+                data.push({
+                    type: "scattergl", mode: "markers", name: s + " sell",
+                    x: pick(x, signals.sell), y: pick(d.h, signals.sell),
+                    marker: {symbol: "triangle-down", color: "rgb(255, 0, 0)", size: 9}, xaxis: "x", yaxis: "y"
+                });
+            });
+            var names = Object.keys(d.returns);
+            var profits = names.map(function(s) { return d.returns[s]; });
+            data.push({
+                type: "bar", orientation: "h", name: "Profit per strategy", showlegend: false,
+                y: names, x: profits, xaxis: "x2", yaxis: "y2",
+                marker: {color: profits.map(function(v) {
+                    return v < 0 ? "rgb(255,0, 0)" : v > 0 ? "rgb(0, 255, 0)" : "rgb(255,255,255)";
+                })}
+            });
+
+            return {
+                data: data,
+                layout: {
+                    title: ticker,
+                    width: 1000,
+                    height: 1000,
+                    uirevision: ticker,
+                    paper_bgcolor: "rgb(17,17,17)",
+                    plot_bgcolor: "rgb(17,17,17)",
+                    font: {color: "#f2f5fa"},
+                    xaxis: {type: "date", domain: [0, 1], anchor: "y", rangeslider: {visible: false}},
+                    yaxis: {domain: [0.35, 1], anchor: "x"},
+                    xaxis2: {domain: [0, 1], anchor: "y2"},
+                    yaxis2: {domain: [0, 0.2], anchor: "x2"}
+                }
+            };
+        }
+    }
+});
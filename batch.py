@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from code2 import Data
+from instrument import tickerContext
+from network import CachedSession
+from pipeline import Ingestion
+from registry import DEFAULT_PARAMS
+from screener import SCREENER_FILE, ScreenerIndex
+from signals import encodeSignals
+from snapshot import Snapshot
+from store import Store
+
+logger = logging.getLogger(__name__)
+
+#stages of a ticker, each one reading the output of the one before
+STAGES = ['fetch', 'indicators', 'strategies', 'returns', 'figure']
+#directory of the checkpoints in the data directory
+BATCH_DIR = 'batch'
+
+
+def frameHash(df):
+    # hash of the content of a frame, signals by their codes
+    h = hashlib.sha1()
+    for col in df.columns:
+        values = df[col].values
+        if col == 'Date':
+            values = np.asarray(values, dtype='datetime64[ns]').view('int64')
+        elif 'signal' in col:
+            values = encodeSignals(values)
+        h.update(col.encode())
+        h.update(np.ascontiguousarray(values, dtype=values.dtype).tobytes())
+    return h.hexdigest()
+
+
+def textHash(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def stageKey(stage, *inputs):
+    # key of a stage run : its name and the hashes / parameters it depends on
+    return textHash(json.dumps([stage] + list(inputs), sort_keys=True, default=str))
+
+
+class BatchRunner:
+    # Resumable batch version of main().
+    # Every ticker goes through the STAGES; after each one a checkpoint is
+    # saved with the key of its inputs (hash of the output of the stage before
+    # and its parameters) and the hash of its own output, in
+    # <data_dir>/batch/checkpoints/<ticker>.json. A stage whose key did not
+    # change since its checkpoint is skipped without reading anything, so a
+    # rerun with no new bars only compares hashes. A failing ticker is logged
+    # and reported and the others go on; the next run resumes it from the
+    # stage that failed. The bars are fetched again once per day (the day is
+    # part of the fetch key). Outputs : bars and indicators in stores under
+    # batch/, the frames with signals in the data store like main(), returns
+    # and figure json under batch/<stage>/.
+
+    def __init__(self, data, workers=8):
+
+        self.data = data
+        self.workers = workers
+        self.ingestion = Ingestion(data, workers=workers)
+        self.root = os.path.join(data.data_dir, BATCH_DIR)
+        self.stores = {
+            'fetch': Store(os.path.join(self.root, 'fetch')),
+            'indicators': Store(os.path.join(self.root, 'indicators')),
+            'strategies': data.store,
+        }
+        for stage in ('checkpoints', 'returns', 'figure'):
+            os.makedirs(os.path.join(self.root, stage), exist_ok=True)
+        #the stores rewrite their manifest on every write
+        self.lock = threading.Lock()
+
+    def checkpointPath(self, ticker):
+        return os.path.join(self.root, 'checkpoints', ticker + '.json')
+
+    def loadCheckpoints(self, ticker):
+        path = self.checkpointPath(ticker)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def saveCheckpoints(self, ticker, checkpoints):
+        tmp = self.checkpointPath(ticker) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(checkpoints, f)
+        os.replace(tmp, self.checkpointPath(ticker))
+
+    def outputPath(self, stage, ticker):
+        return os.path.join(self.root, stage, ticker + '.json')
+
+    def exists(self, stage, ticker):
+        if stage in self.stores:
+            return ticker in self.stores[stage].manifest
+        return os.path.exists(self.outputPath(stage, ticker))
+
+    def key(self, stage, ticker, checkpoints):
+        # None when the input of the stage has no checkpoint yet
+        if stage == 'fetch':
+            return stageKey(stage, ticker, str(self.data.startdate), str(self.data.enddate.date()))
+        previous = checkpoints.get(STAGES[STAGES.index(stage) - 1])
+        if previous is None:
+            return None
+        if stage == 'indicators':
+            return stageKey(stage, previous['output'], dict(DEFAULT_PARAMS, rsi_period=self.data.rsi_period))
+        return stageKey(stage, previous['output'])
+
+    def load(self, stage, ticker):
+        # output of a stage from its checkpoint
+        if stage in self.stores:
+            return self.stores[stage].read(ticker)
+        with open(self.outputPath(stage, ticker)) as f:
+            content = json.load(f)
+        if stage == 'returns':
+            return pd.DataFrame({'crypto': pd.Series(content['returns'])})
+        return content
+
+    def save(self, stage, ticker, output):
+        # writes the output of a stage, returns its hash
+        if stage in self.stores:
+            with self.lock:
+                if stage == 'strategies':
+                    self.data.exportData(output, ticker)
+                else:
+                    self.stores[stage].write(ticker, output)
+            return frameHash(output)
+        if stage == 'returns':
+            returns, metrics = output
+            text = json.dumps({'returns': returns['crypto'].to_dict(), 'metrics': metrics})
+        else:
+            text = output.to_json()
+        tmp = self.outputPath(stage, ticker) + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, self.outputPath(stage, ticker))
+        return textHash(text)
+
+    def compute(self, stage, ticker, inputs):
+        # output of a stage from the outputs of the stages before it
+        if stage == 'fetch':
+            return self.ingestion.fetch(ticker)
+        if stage == 'indicators':
+            return self.data.computeIndicators(inputs('fetch'), key=ticker)
+        if stage == 'strategies':
+            return self.data.computeStrategies(inputs('indicators'))
+        df = inputs('strategies')
+        if stage == 'returns':
+            return self.data.get_returns(df, ticker), self.data.equityMetrics(ticker, df)
+        return self.data.tickerFigure(df, inputs('returns'), ticker)
+
+    def runTicker(self, ticker, stages=STAGES, force=False):
+        # {stage: 'run' / 'skipped'} of one ticker, raises on the first
+        # stage that fails once the stages before it are checkpointed
+        checkpoints = self.loadCheckpoints(ticker)
+        outputs = {}
+
+        def inputs(stage):
+            if stage not in outputs:
+                if stage not in checkpoints or not self.exists(stage, ticker):
+                    raise RuntimeError(f'no checkpoint of the {stage} stage of {ticker}, run it first')
+                outputs[stage] = self.load(stage, ticker)
+            return outputs[stage]
+
+        status = {}
+        with tickerContext(ticker):
+            for stage in stages:
+                key = self.key(stage, ticker, checkpoints)
+                done = checkpoints.get(stage)
+                if not force and key is not None and done is not None and done['key'] == key \
+                        and self.exists(stage, ticker):
+                    status[stage] = 'skipped'
+                    continue
+                output = self.compute(stage, ticker, inputs)
+                outputs[stage] = output[0] if stage == 'returns' else output
+                checkpoints[stage] = {'key': key,
+                                      'output': self.save(stage, ticker, output),
+                                      'time': time.time()}
+                self.saveCheckpoints(ticker, checkpoints)
+                status[stage] = 'run'
+        return status
+
+    def run(self, tickers, stages=STAGES, force=False):
+        # (status by ticker, errors by ticker), in the order of the STAGES
+        stages = [stage for stage in STAGES if stage in stages]
+        status, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {ticker: pool.submit(self.runTicker, ticker, stages, force) for ticker in tickers}
+            for ticker, future in futures.items():
+                try:
+                    status[ticker] = future.result()
+                except Exception as e:
+                    logger.error('%s failed: %r', ticker, e)
+                    errors[ticker] = e
+        return status, errors
+
+    def updateScreener(self, status):
+        # screener index updated with the tickers whose signals were recomputed
+        path = os.path.join(self.data.data_dir, SCREENER_FILE)
+        index = ScreenerIndex.load(path)
+        for ticker, stages in status.items():
+            if stages.get('strategies') == 'run' or ticker not in index:
+                index.updateFrame(ticker, self.data.store.read(ticker))
+        index.save(path)
+
+    def snapshot(self, tickers):
+        # Snapshot of the tickers whose returns are checkpointed, for the app
+        done = [t for t in tickers if 'returns' in self.loadCheckpoints(t) and self.exists('returns', t)]
+        returns, metrics = {}, {}
+        for ticker in done:
+            with open(self.outputPath('returns', ticker)) as f:
+                content = json.load(f)
+            returns[ticker] = pd.DataFrame({'crypto': pd.Series(content['returns'])})
+            metrics[ticker] = content['metrics']
+        return Snapshot(self.data.store, done, {}, returns, metrics=metrics)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Resumable batch run of the fetch / indicators / strategies / '
+                                                 'returns / figure stages, skipping the ones whose inputs did not change')
+    parser.add_argument('--tickers', nargs='+', default=None, help='tickers to run, the universe by default')
+    parser.add_argument('--size', type=int, default=50, help='number of symbols of the universe')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help='stages to run, the others are only read from their checkpoints')
+    parser.add_argument('--force', action='store_true', help='run the stages even when their inputs did not change')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--data-dir', default=os.path.join(os.getcwd(), 'data'))
+    parser.add_argument('--cache-only', action='store_true', help='answer every download from the http cache')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    session = CachedSession(os.path.join(args.data_dir, 'http_cache'), args.workers, cache_only=args.cache_only)
+    runner = BatchRunner(Data(args.data_dir, session=session), args.workers)
+    tickers = args.tickers if args.tickers else runner.data.getSymbols(args.size)
+
+    start = time.perf_counter()
+    status, errors = runner.run(tickers, args.stages, args.force)
+    for stage in [s for s in STAGES if s in args.stages]:
+        counts = [s[stage] for s in status.values()]
+        print(f'{stage:<12} run : {counts.count("run"):>4}  skipped : {counts.count("skipped"):>4}')
+    for ticker, e in errors.items():
+        print(f'failed : {ticker} : {e!r}')
+    print(f'{len(status)} tickers done, {len(errors)} failed in {time.perf_counter() - start:.2f} s')
+
+    #results the dashboard starts from, as after main()
+    if 'strategies' in args.stages:
+        runner.updateScreener(status)
+    snapshot = runner.snapshot(tickers)
+    if snapshot.tickers:
+        snapshot.save()
+    else:
+        #keep the last snapshot rather than replacing it with an empty one
+        print('no ticker has returns, the snapshot is left unchanged')
@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from code2 import Data, Analysis, STRATEGY_NAMES
+from compact import CompactFrames
+from downsample import browserData
+from live import BarSimulator, LiveTicker, extendUpdate
+from network import CachedSession, makeSession
+from pipeline import Ingestion
+from providers import HttpProvider
+from screener import SCREENS, ScreenerIndex
+from sweep import makeGrid, sweep
+from walkforward import summarize, walkForward, windows
+
+
+def syntheticData(n_bars, seed=0, freq=None):
+    # random walk OHLCV frame shaped like the output of Data.getData
+    # daily bars, or minute bars when the daily dates would not fit pandas
+    freq = freq if freq is not None else ('D' if n_bars < 100000 else 'min')
+    rng = np.random.RandomState(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, n_bars)))
+    spread = np.abs(rng.normal(0, 0.02, n_bars)) * close
+    open_ = np.r_[close[0], close[:-1]]
+    return pd.DataFrame({
+        'Date': pd.date_range('2000-01-01', periods=n_bars, freq=freq),
+        'High': np.maximum(open_, close) + spread,
+        'Low': np.minimum(open_, close) - spread,
+        'Open': open_,
+        'Close': close,
+        'Volume': rng.randint(1e3, 1e6, n_bars).astype(float),
+    })
+
+
+def loopSignals(df, entry, exit):
+    # reference: the per-row loop used by the strat* methods before the engine
+    signal = [None] * len(df)
+    buy_auto = True
+    for i in range(len(df)):
+        if (buy_auto == True) & bool(entry.iloc[i]):
+            buy_auto = False
+            signal[i] = "buy"
+        if (buy_auto == False) & bool(exit.iloc[i]):
+            buy_auto = True
+            signal[i] = "sell"
+    return signal
+
+
+def benchStrategies(n_bars=7000, seed=0):
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        data = Data(data_dir=data_dir)
+        df = data.computeIndicators(syntheticData(n_bars, seed))
+        conditions = {
+            'signal_ma': (df['20_sma'] > df['50_sma'], df['20_sma'] < df['50_sma']),
+            'signal_bo': (df['low_boll'] > df['Close'], df['high_boll'] < df['Close']),
+            'signal_rsi': (df['rsi'] < 40, df['rsi'] > 60),
+        }
+
+        start = time.perf_counter()
+        expected = {col: loopSignals(df, *cond) for col, cond in conditions.items()}
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df = data.computeStrategies(df)
+        engine_time = time.perf_counter() - start
+
+        for col, signal in expected.items():
+            assert (df[col].fillna('').values == pd.Series(signal, dtype=object).fillna('').values).all(), col
+
+        print(f'computeStrategies on {n_bars} bars : \
+              \n row loop : {loop_time:.4f} s \
+              \n engine : {engine_time:.4f} s \
+              \n speedup : x {loop_time / engine_time:.1f}')
+
+
+def benchUniverse(n_tickers=50, n_bars=3000):
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        data = Data(data_dir=data_dir)
+        #staggered listing dates, the last ticker lists halfway through
+        frames = {}
+        for i in range(n_tickers):
+            lag = i * n_bars // (2 * n_tickers)
+            df = syntheticData(n_bars - lag, seed=i)
+            frames[f'T{i}-USD'] = df.assign(Date=df['Date'] + pd.Timedelta(days=lag))
+
+        start = time.perf_counter()
+        for df in frames.values():
+            data.computeStrategies(data.computeIndicators(df.copy()))
+        ticker_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data.computeUniverse(frames)
+        panel_time = time.perf_counter() - start
+
+        print(f'indicators and strategies for {n_tickers} tickers : \
+              \n per ticker : {ticker_time:.3f} s \
+              \n panel : {panel_time:.3f} s \
+              \n speedup : x {ticker_time / panel_time:.1f}')
+
+
+def benchSweep(n_tickers=50, n_bars=7000, workers=None):
+
+    frames = {f'T{i}-USD': syntheticData(n_bars, seed=i) for i in range(n_tickers)}
+    grid = makeGrid()
+    combos = sum(len(params) for params in grid.values())
+
+    start = time.perf_counter()
+    table = sweep(frames, grid, workers=workers)
+    sweep_time = time.perf_counter() - start
+    assert len(table) == n_tickers * combos
+
+    print(f'parameter sweep of {combos} combinations x {n_tickers} tickers : {sweep_time:.1f} s')
+
+
+def benchWalkForward(n_tickers=50, n_bars=7000, workers=None):
+
+    frames = {f'T{i}-USD': syntheticData(n_bars, seed=i) for i in range(n_tickers)}
+    grid = makeGrid()
+
+    start = time.perf_counter()
+    table = walkForward(frames, grid, workers=workers)
+    wf_time = time.perf_counter() - start
+    n_windows = len(windows(n_bars))
+    assert len(table) == n_tickers * n_windows * len(grid)
+
+    print(f'walk-forward of {n_windows} windows x {n_tickers} tickers : {wf_time:.1f} s')
+    print(summarize(table).groupby('strategy')[['test_value', 'train_value']].mean())
+
+
+def benchFigures(n_tickers=50, n_bars=7000):
+    # initial figure sent to the browser: every ticker at once vs the first one
+    with tempfile.TemporaryDirectory() as data_dir:
+        data = Data(data_dir=data_dir)
+        frames = [data.computeStrategies(data.computeIndicators(syntheticData(n_bars, seed=i)))
+                  for i in range(n_tickers)]
+        returns = [data.get_returns(df, None) for df in frames]
+
+        start = time.perf_counter()
+        figure, buttons = data.defineFig(frames[0], returns[0], 'T0-USD', n_tickers)
+        for i in range(1, n_tickers):
+            figure, buttons = data.addNew(frames[i], returns[i], f'T{i}-USD', figure, n_tickers, i, buttons)
+        figure.update_layout(updatemenus=[dict(active=0, buttons=tuple(buttons))])
+        full_json = figure.to_json()
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        single_json = data.tickerFigure(frames[0], returns[0], 'T0-USD').to_json()
+        single_time = time.perf_counter() - start
+
+        print(f'initial figure for {n_tickers} tickers of {n_bars} bars : \
+              \n all tickers : {len(full_json) / 1e6:.1f} MB built in {full_time:.2f} s \
+              \n one ticker : {len(single_json) / 1e6:.1f} MB built in {single_time:.2f} s')
+
+
+def benchClientside(n_tickers=50, n_bars=7000):
+    # bytes sent for the charts: a server figure per ticker switch vs the
+    # clientside store sent once, after which a switch sends nothing
+    with tempfile.TemporaryDirectory() as data_dir:
+        data = Data(data_dir=data_dir)
+        frames = [data.computeStrategies(data.computeIndicators(syntheticData(n_bars, seed=i)))
+                  for i in range(n_tickers)]
+        returns = [data.get_returns(df, None) for df in frames]
+
+        start = time.perf_counter()
+        figure_bytes = len(data.tickerFigure(frames[0], returns[0], 'T0-USD', gl=True).to_json())
+        figure_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = {f'T{i}-USD': browserData(df, r, STRATEGY_NAMES) for i, (df, r) in enumerate(zip(frames, returns))}
+        store_bytes = len(json.dumps(store))
+        store_time = time.perf_counter() - start
+
+        print(f'charts of {n_tickers} tickers of {n_bars} bars : \
+              \n server figure : {figure_bytes / 1e6:.2f} MB per switch, built in {figure_time:.2f} s \
+              \n clientside store : {store_bytes / 1e6:.2f} MB once for all tickers ({store_bytes / n_tickers / 1e3:.0f} kB per ticker), built in {store_time:.2f} s')
+
+
+def benchCompact(n_tickers=50, n_bars=7000):
+    # resident memory of the frames of the universe, regular vs compact (and
+    # with float32 prices), and the time to write them to the store
+    with tempfile.TemporaryDirectory() as data_dir:
+        data = Data(data_dir=data_dir)
+        frames = {f'T{i}-USD': data.computeStrategies(data.computeIndicators(syntheticData(n_bars, seed=i)))
+                  for i in range(n_tickers)}
+        full_bytes = sum(df.memory_usage(index=True, deep=True).sum() for df in frames.values())
+
+        start = time.perf_counter()
+        for ticker, df in frames.items():
+            data.store.write(ticker, df)
+        full_time = time.perf_counter() - start
+        print(f'frames of {n_tickers} tickers of {n_bars} bars : \
+              \n regular : {full_bytes / 1e6:.1f} MB, stored in {full_time:.2f} s')
+
+        expected = data.get_returns(frames['T0-USD'], None).values
+        for label, prices32 in (('compact', False), ('compact, float32 prices', True)):
+            compact = CompactFrames(frames, prices32=prices32)
+            start = time.perf_counter()
+            for ticker in compact.keys():
+                data.store.writeColumns(ticker, compact.encoded(ticker))
+            compact_time = time.perf_counter() - start
+            returns = data.get_returns(compact[0], None).values
+            error = np.abs(returns - expected).max() / np.abs(expected).max()
+            print(f' {label} : {compact.nbytes / 1e6:.1f} MB, stored in {compact_time:.2f} s '
+                  f'({full_bytes / compact.nbytes:.1f}x smaller, returns within {error:.0e})')
+
+
+def benchLive(histories=(1000, 10000, 100000), n_updates=200):
+    # time from the arrival of a live bar to its extendData update, which
+    # should not depend on the length of the history
+    with tempfile.TemporaryDirectory() as data_dir:
+        data = Data(data_dir=data_dir)
+        for n_bars in histories:
+            history = data.computeStrategies(data.computeIndicators(syntheticData(n_bars, freq='min')))
+            live = LiveTicker(data, history)
+            simulator = BarSimulator(history, seed=0)
+            seq = 0
+            start = time.perf_counter()
+            for _ in range(n_updates):
+                live.push(simulator.next())
+                new, seq = live.since(seq)
+                extendUpdate([row for _, row in new])
+            print(f'live update with {n_bars} bars of history : {(time.perf_counter() - start) / n_updates * 1e3:.2f} ms per bar')
+
+
+def standInServer(frames, latency):
+    # local HTTP server answering GET /<ticker>.csv after `latency` seconds
+    bodies = {f'/{ticker}.csv': df.to_csv(index=False).encode() for ticker, df in frames.items()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = bodies.get(self.path.split('?')[0])
+            self.send_response(200 if body is not None else 404)
+            self.send_header('Content-Length', str(len(body or b'')))
+            self.end_headers()
+            self.wfile.write(body or b'')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchScreener(n_tickers=5000, n_bars=400, repeat=100):
+    # screens over the latest state of a universe : the index vs scanning the
+    # last bars of every frame
+    with tempfile.TemporaryDirectory() as data_dir:
+        data = Data(data_dir=data_dir)
+        frames = [data.computeStrategies(data.computeIndicators(syntheticData(n_bars, seed=i % 50)))
+                  for i in range(50)]
+        frames = {f'T{i}-USD': frames[i % 50] for i in range(n_tickers)}
+        index = ScreenerIndex()
+        start = time.perf_counter()
+        for ticker, df in frames.items():
+            index.updateFrame(ticker, df)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            found = index.query(SCREENS["RSI below 40"], sort='rsi')
+        index_time = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        scanned = [ticker for ticker, df in frames.items() if df['rsi'].iloc[-1] < 40]
+        scan_time = time.perf_counter() - start
+        assert sorted(found['ticker']) == sorted(scanned)
+        print(f'RSI below 40 over {n_tickers} tickers : \
+              \n index : {index_time * 1e3:.2f} ms per query (built in {build_time:.2f} s) \
+              \n scan of the frames : {scan_time * 1e3:.1f} ms')
+
+
+def benchIngest(n_tickers=50, n_bars=2000, latency=0.2, workers=8):
+
+    frames = {f'T{i}-USD': syntheticData(n_bars, seed=i) for i in range(n_tickers)}
+    server = standInServer(frames, latency)
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    tickers = list(frames) + ['MISSING-USD']
+
+    timings = {}
+    for n in (1, workers):
+        with tempfile.TemporaryDirectory() as data_dir:
+            data = Data(data_dir=data_dir, provider=HttpProvider(url, makeSession(n)))
+            start = time.perf_counter()
+            done, errors = Ingestion(data, workers=n, rate=None, retries=1, backoff=0.01).run(tickers)
+            timings[n] = time.perf_counter() - start
+            assert list(done) == list(frames) and list(errors) == ['MISSING-USD']
+    server.shutdown()
+
+    print(f'ingestion of {n_tickers} tickers with {latency} s latency : \
+          \n 1 worker : {timings[1]:.2f} s \
+          \n {workers} workers : {timings[workers]:.2f} s \
+          \n speedup : x {timings[1] / timings[workers]:.1f}')
+
+
+def benchNetwork(n_tickers=20, n_bars=2000, latency=0.2, workers=8):
+    # requests reaching the stand-in server : cold run with every ticker asked
+    # twice at once, warm rerun from the cache, and cache-only rerun offline
+    frames = {f'T{i}-USD': syntheticData(n_bars, seed=i) for i in range(n_tickers)}
+    server = standInServer(frames, latency)
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    hits = []
+    handle = server.RequestHandlerClass.do_GET
+    server.RequestHandlerClass.do_GET = lambda self: (hits.append(self.path), handle(self))[1]
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        cache_dir = os.path.join(data_dir, 'http_cache')
+        timings = {}
+        for run, cache_only in (('cold', False), ('warm', False), ('cache-only', True)):
+            if cache_only:
+                server.shutdown()
+                server.server_close()
+            session = CachedSession(cache_dir, workers, cache_only=cache_only)
+            data = Data(data_dir=data_dir, provider=HttpProvider(url, session), session=session)
+            del hits[:]
+            start = time.perf_counter()
+            done, errors = Ingestion(data, workers=workers, rate=None, retries=0, incremental=False).run(list(frames) * 2)
+            timings[run] = (time.perf_counter() - start, len(hits))
+            assert list(done) == list(frames) and not errors
+
+    print(f'downloads of {n_tickers} tickers asked twice with {latency} s latency : ' + ''.join(
+        f'\n {run} : {seconds:.2f} s, {count} requests to the server' for run, (seconds, count) in timings.items()))
+
+
+def syntheticUniverse(n_tickers, n_bars, seed=0):
+    return {f'T{i}-USD': syntheticData(n_bars, seed=seed + i) for i in range(n_tickers)}
+
+
+def copies(frames):
+    return {ticker: df.copy() for ticker, df in frames.items()}
+
+
+def withIndicators(data, frames):
+    return {ticker: data.computeIndicators(df.copy()) for ticker, df in frames.items()}
+
+
+def withSignals(data, frames):
+    return {ticker: data.computeStrategies(df) for ticker, df in withIndicators(data, frames).items()}
+
+
+def exported(data, frames):
+    frames = withSignals(data, frames)
+    for ticker, df in frames.items():
+        data.exportData(df, ticker)
+    return frames
+
+
+def figure(data, frames):
+    tickers = list(frames)
+    for i, ticker in enumerate(tickers):
+        returns = data.get_returns(frames[ticker], ticker)
+        if i == 0:
+            fig, buttons = data.defineFig(frames[ticker], returns, ticker, len(tickers))
+        else:
+            fig, buttons = data.addNew(frames[ticker], returns, ticker, fig, len(tickers), i, buttons)
+    return fig
+
+
+def csvRoundTrip(data, frames):
+    for ticker, df in frames.items():
+        path = os.path.join(data.data_dir, ticker + '.csv')
+        df.to_csv(path)
+        pd.read_csv(path)
+
+
+# stage -> (inputs prepared outside of the measure, measured function)
+STAGES = {
+    'indicators': (lambda data, frames: copies(frames),
+                   lambda data, frames: [data.computeIndicators(df) for df in frames.values()]),
+    'strategies': (withIndicators,
+                   lambda data, frames: [data.computeStrategies(df) for df in frames.values()]),
+    'universe': (lambda data, frames: frames,
+                 lambda data, frames: data.computeUniverse(frames)),
+    'returns': (withSignals,
+                lambda data, frames: [data.get_returns(df, ticker) for ticker, df in frames.items()]),
+    'figure': (withSignals, figure),
+    'csv': (withSignals, csvRoundTrip),
+    'export': (withSignals,
+               lambda data, frames: [data.exportData(df, ticker) for ticker, df in frames.items()]),
+    'import': (exported,
+               lambda data, frames: [data.store.read(ticker) for ticker in frames]),
+    'aggregate': (exported,
+                  lambda data, frames: Analysis(data.data_dir).aggregate()),
+}
+
+#figures of more bars than this are not built (the browser could not show them)
+MAX_FIGURE_BARS = 1000000
+
+
+def measure(stage, n_bars, n_tickers, seed=0, repeat=3):
+    # best time over `repeat` runs, then the peak of traced memory on one more run
+    prepare, run = STAGES[stage]
+    frames = syntheticUniverse(n_tickers, n_bars, seed)
+    times = []
+    peak = 0
+    for i in range(repeat + 1):
+        data_dir = tempfile.mkdtemp()
+        try:
+            data = Data(data_dir=data_dir)
+            inputs = prepare(data, frames)
+            if i < repeat:
+                start = time.perf_counter()
+                run(data, inputs)
+                times.append(time.perf_counter() - start)
+            else:
+                tracemalloc.start()
+                run(data, inputs)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        finally:
+            shutil.rmtree(data_dir)
+    return {'stage': stage, 'bars': n_bars, 'tickers': n_tickers,
+            'seconds': min(times), 'peak_mb': peak / 1e6}
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'date': datetime.now().isoformat(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine()}
+
+
+def runSuite(bars=(1000, 10000), tickers=(1, 10), stages=None, seed=0, repeat=3, output=None):
+
+    results = []
+    for stage in stages or list(STAGES):
+        for n_bars in bars:
+            for n_tickers in tickers:
+                if stage == 'figure' and n_bars * n_tickers > MAX_FIGURE_BARS:
+                    continue
+                result = measure(stage, n_bars, n_tickers, seed, repeat)
+                print(f"{stage:<12}{n_bars:>10} bars {n_tickers:>6} tickers : "
+                      f"{result['seconds']:9.4f} s {result['peak_mb']:9.1f} MB")
+                results.append(result)
+
+    report = {'environment': environment(), 'seed': seed, 'results': results}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=1)
+    return report
+
+
+def compareReports(old, new):
+    # time and memory ratios new / old of the cases measured in both reports
+    before = {(r['stage'], r['bars'], r['tickers']): r for r in old['results']}
+    for r in new['results']:
+        key = (r['stage'], r['bars'], r['tickers'])
+        if key in before:
+            print(f"{key[0]:<12}{key[1]:>10} bars {key[2]:>6} tickers : "
+                  f"time x {r['seconds'] / before[key]['seconds']:.2f} "
+                  f"memory x {r['peak_mb'] / max(before[key]['peak_mb'], 1e-9):.2f}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the Data / Analysis stages')
+    parser.add_argument('--bars', type=int, nargs='+', default=[1000, 10000],
+                        help='bar counts per ticker (1k to 10M)')
+    parser.add_argument('--tickers', type=int, nargs='+', default=[1, 10],
+                        help='ticker counts (1 to 1000)')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='json file receiving the results')
+    parser.add_argument('--compare', help='json results of a previous run to compare with')
+    parser.add_argument('--comparisons', action='store_true',
+                        help='run the before/after comparisons of the optimisations instead')
+    args = parser.parse_args()
+
+    if args.comparisons:
+        benchStrategies()
+        benchUniverse()
+        benchSweep()
+        benchWalkForward()
+        benchFigures()
+        benchClientside()
+        benchCompact()
+        benchLive()
+        benchScreener()
+        benchIngest()
+        benchNetwork()
+    else:
+        report = runSuite(args.bars, args.tickers, args.stages, args.seed, args.repeat, args.output)
+        if args.compare:
+            with open(args.compare) as f:
+                compareReports(json.load(f), report)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+
+import numpy as np
+
+from signals import encodeSignals, lastState
+from store import Store
+
+logger = logging.getLogger(__name__)
+
+#rows per chunk, about 120 MB of indicators and signals for minute bars
+CHUNK_ROWS = 500000
+#rows of history every indicator of computeIndicators looks back at (annual returns)
+HALO = 365
+#width of the bollinger bands in std of the 200 SMA, as in computeIndicators
+BAND_WIDTH = 0.5
+
+
+class ChunkedPipeline:
+    # Out-of-core computeIndicators + computeStrategies over the bars of a store.
+    # A ticker is read chunk_rows rows at a time through the memmapped columns,
+    # each chunk with the HALO rows before it so the rolling windows and the
+    # returns continue over the boundary, and the position of each strategy is
+    # carried from one chunk to the next. The results are written to the
+    # target store chunk by chunk, so memory stays bounded by the chunk size.
+    # The bollinger width needs the std of the whole 200 SMA, which a first
+    # pass over the closes computes with merged chunk moments; the output is
+    # the same as running the two methods on the full history.
+
+    def __init__(self, data, source, target, chunk_rows=CHUNK_ROWS):
+
+        if source.data_dir == target.data_dir:
+            raise ValueError('the target store must differ from the source store')
+        self.data = data
+        self.source = source
+        self.target = target
+        self.chunk_rows = chunk_rows
+
+    def chunks(self, ticker, columns=None):
+        # (rows of halo, frame) of each chunk of the ticker
+        n = self.source.manifest[ticker]['rows']
+        for lo in range(0, n, self.chunk_rows):
+            start = max(lo - HALO, 0)
+            df = self.source.read(ticker, columns=columns, rows=slice(start, lo + self.chunk_rows))
+            yield lo - start, df
+
+    def bandStd(self, ticker):
+        # population std of the 200 SMA over the whole ticker, chunk moments
+        # merged with the parallel variance formula
+        count, mean, m2 = 0, 0.0, 0.0
+        for halo, df in self.chunks(ticker, columns=['Close']):
+            sma = df['Close'].rolling(200).mean().values[halo:]
+            sma = sma[~np.isnan(sma)]
+            if not len(sma):
+                continue
+            k, m = len(sma), sma.mean()
+            delta = m - mean
+            mean += delta * k / (count + k)
+            m2 += ((sma - m) ** 2).sum() + delta ** 2 * count * k / (count + k)
+            count += k
+        return np.sqrt(m2 / count) if count else np.nan
+
+    def run(self, ticker):
+        # computes and writes the indicators and signals of one ticker,
+        # returns the number of rows written
+
+        width = BAND_WIDTH * self.bandStd(ticker)
+        positions = {}
+        rows = 0
+        for halo, df in self.chunks(ticker):
+            df = self.data.computeIndicators(df)
+            df['low_boll'] = df['50_sma'] - width
+            df['high_boll'] = df['50_sma'] + width
+            df = df.iloc[halo:].reset_index(drop=True)
+            df = self.data.computeStrategies(df, positions)
+            positions = {col: lastState(encodeSignals(df[col].values), positions.get(col, 0))
+                         for col in df.columns if 'signal' in col}
+            if rows:
+                self.target.append(ticker, df)
+            else:
+                self.target.write(ticker, df)
+            rows += len(df)
+            logger.info('%s : %d rows processed', ticker, rows)
+        return rows
+
+    def runAll(self, tickers=None):
+        # one ticker after the other, the manifest of a store is not shared
+        # between processes
+        tickers = self.source.tickers() if tickers is None else tickers
+        return {ticker: self.run(ticker) for ticker in tickers}
+
+
+if __name__ == '__main__':
+
+    from code2 import Data
+
+    parser = argparse.ArgumentParser(description='Indicators and signals of the stored bars, chunk by chunk')
+    parser.add_argument('source', help='store holding the bars')
+    parser.add_argument('target', help='store receiving the bars with their indicators and signals')
+    parser.add_argument('--tickers', nargs='+', default=None)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    pipeline = ChunkedPipeline(Data(data_dir=args.source), Store(args.source), Store(args.target), args.chunk_rows)
+    pipeline.runAll(args.tickers)
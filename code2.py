@@ -1,377 +1,578 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-import requests
-from datetime import datetime
-import numpy as np
-from pandas_datareader import data as pdr
-import bs4 as bs
-import os 
-import pandas as pd
-import glob
-
-from plotly.offline import plot
-import plotly.graph_objs as go
-import plotly.io as pio
-pio.templates
-
-from plotly.subplots import make_subplots
-
-class Data:
-    def __init__(self):
-
-        self.base = 'https://finance.yahoo.com/'
-        self.endpoints = {
-            "klines": '/api/v3/klines',
-            "cryptocurrencies": '/cryptocurrencies',
-        }
-        self.startdate = datetime(2000, 1, 1)
-        self.enddate = datetime.today()
-        self.path = os.getcwd() + '/'
-        self.rsi_period = 14
-
-
-    def getSymbols(self):
-
-        url = self.base + self.endpoints["cryptocurrencies"]
-
-        resp = requests.get(url)
-        soup = bs.BeautifulSoup(resp.text, 'lxml')
-        table = soup.find('table', {'class': 'W(100%)'})  # find table in this page
-        tickers = []  # save tickers column here
-
-        for row in table.findAll('tr')[1:]:  # each row is identified by header('tr') in html code
-            ticker = row.findAll('td')[0].text  # find the first cell and extract from the text
-            tickers.append(ticker)
-
-        return tickers
-    
-    def getData(self, tickers):
-        
-        return pdr.get_data_yahoo(tickers, self.startdate, self.enddate).reset_index().drop(columns= {'Adj Close'})
-    
-    def computeIndicators(self, df):
-    
-        #get moving average
-        df['20_sma'] = df['Close'].rolling(20).mean()
-        df['50_sma'] = df['Close'].rolling(50).mean()
-        df['200_sma'] = df['Close'].rolling(200).mean()
-
-        #get bollinger bands
-        ##########   CHANGE 0.5  ############
-        df['low_boll'] =  df['50_sma'] - 0.5 * np.std(df['200_sma'])
-        df['high_boll'] = df['50_sma'] + 0.5 * np.std(df['200_sma'])
-        
-        #get returns
-        df['daily_returns'] = df['Close'].pct_change(1)
-        df['monthly_returns'] = df['Close'].pct_change(31)
-        df['annual_returns'] = df['Close'].pct_change(365)
-    
-        #Compute RSI
-        delta = df['Close'].diff().dropna()
-        delta = delta.diff().dropna()
-        up, down = delta.copy(), delta.copy()
-        up[up < 0] = 0
-        down[down > 0] = 0
-        roll_up = up.rolling(self.rsi_period).mean()
-        roll_down = down.abs().rolling(self.rsi_period).mean()
-        rs = roll_up / roll_down
-        df['rsi'] = 100.0 - (100.0 / (1.0 + rs))
-        
-        return df
-    
-    def stratMA(self, df):
-        
-        df['signal_ma'] = None
-        buy_auto = True
-        
-        for i in range(len(df)):
-            
-            if (buy_auto == True) & (df['20_sma'].iloc[i] > df['50_sma'].iloc[i]):
-                buy_auto = False
-                df['signal_ma'].iloc[i] = "buy"
-               
-            if (buy_auto == False) & (df['20_sma'].iloc[i] < df['50_sma'].iloc[i]):
-                buy_auto = True
-                df['signal_ma'].iloc[i] = "sell"
-                
-        return df
-    
-    def stratBO(self, df):
-        
-        df['signal_bo'] = None
-        buy_auto = True
-        
-        for i in range(len(df)):
-            
-            if (buy_auto == True) & (df['low_boll'].iloc[i] > df['Close'].iloc[i]):
-                buy_auto = False
-                df['signal_bo'].iloc[i] = "buy"
-               
-            if (buy_auto == False) & ((df['high_boll'].iloc[i] < df['Close'].iloc[i])):
-                buy_auto = True
-                df['signal_bo'].iloc[i] = "sell"
-                
-        return df
-    
-    def stratRSI(self, df):
-        
-        df['signal_rsi'] = None
-        buy_auto = True
-        
-        for i in range(len(df)):
-            
-            if (buy_auto == True) & (df['rsi'].iloc[i] < 40):
-                buy_auto = False
-                df['signal_rsi'].iloc[i] = "buy"
-               
-            if (buy_auto == False) & (df['rsi'].iloc[i] > 60):
-                buy_auto = True
-                df['signal_rsi'].iloc[i] = "sell"
-                
-        return df
-    
-    def computeStrategies(self, df):
-        
-        df = self.stratBO(df)
-        df = self.stratMA(df)
-        df = self.stratRSI(df)
-        
-        return df
-    
-    def exportData(self, df, ticker):
-        df.to_csv(self.path + ticker + '.csv')
-    
-    #Move this function
-    def defineFig(self, df, returns, plotTicker, size):
-        
-        layout = go.Layout()
-        fig = go.Figure(layout=layout)
-        
-        fig = make_subplots(
-            rows=2, cols=1,
-            column_widths=[0.6],
-            row_heights=[1, 0.3],
-            subplot_titles=("Prices", "Profit per strategy"),
-            vertical_spacing = 0.3,
-            specs=[[{"type": "scatter"}],
-                   [{"type": "bar"}]])
-        fig.add_trace(
-            go.Candlestick(
-            x=df['Date'],
-            open=df['Open'],
-            close=df['Close'],
-            high=df['High'],
-            low=df['Low'],
-            name="Candlesticks"),
-            row=1, col=1)
-        fig.add_trace(
-            go.Scatter(
-            x=df['Date'],
-            y=df['20_sma'],
-            name="20 SMA",
-            line=dict(color=('rgba(102, 207, 255, 50)'))),
-            row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=df['Date'],
-            y=df['50_sma'],
-            name="50 SMA",
-            line=dict(color=('rgba(255, 207, 102, 50)'))),
-            row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=df['Date'],
-            y=df['200_sma'],
-            name="200 SMA",
-            line=dict(color=('rgba(207, 255, 102, 50)'))),
-            row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=df['Date'],
-            y=df['low_boll'],
-            name="Lower Bollinger Band",
-            line=dict(color=('rgba(50, 102, 255, 50)'))),
-            row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=df['Date'],
-            y=df['high_boll'],
-            name="High Bollinger Band",
-            line=dict(color=('rgba(50, 102, 255, 50)'))),
-            row=1, col=1)
-        x=returns.crypto
-        color=np.array(['rgb(255,255,255)']*x.shape[0])
-        color[x<0]='rgb(255,0, 0)'
-        color[x>0]='rgb(0, 255, 0)'
-        fig.add_trace(go.Bar(
-            y=returns.index,
-            x=x,
-            orientation='h',
-            marker = dict(color=color.tolist()),
-            showlegend=False,
-            name= "Profit per strategy"), 
-            row=2, col=1)
-        
-        visible = [True] * 7 + [False] * 7 * (size-1)
-        buttons = list()
-        buttons.append(dict(label=plotTicker,
-                            method="update",
-                            args=[{"visible": visible},
-                                   {"title": plotTicker}]))
-        return fig, buttons
-        
-    def addNew(self, df, returns, plotTicker, prevFig, size, index, buttons):
-        fig = prevFig
-        fig.add_trace(
-            go.Candlestick(
-            x=df['Date'],
-            open=df['Open'],
-            close=df['Close'],
-            high=df['High'],
-            low=df['Low'],
-            name="Candlesticks",
-            visible = False),
-            row=1, col=1)
-        fig.add_trace(
-            go.Scatter(
-            x=df['Date'],
-            y=df['20_sma'],
-            name="20 SMA",
-            visible = False,
-            line=dict(color=('rgba(102, 207, 255, 50)'))),
-            row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=df['Date'],
-            y=df['50_sma'],
-            name="50 SMA",
-            visible = False,
-            line=dict(color=('rgba(255, 207, 102, 50)'))),
-            row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=df['Date'],
-            y=df['200_sma'],
-            name="200 SMA",
-            visible = False,
-            line=dict(color=('rgba(207, 255, 102, 50)'))),
-            row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=df['Date'],
-            y=df['low_boll'],
-            name="Lower Bollinger Band",
-            visible = False,
-            line=dict(color=('rgba(50, 102, 255, 50)'))),
-            row=1, col=1)
-        fig.add_trace(go.Scatter(
-            x=df['Date'],
-            y=df['high_boll'],
-            name="High Bollinger Band",
-            visible = False,
-            line=dict(color=('rgba(50, 102, 255, 50)'))),
-            row=1, col=1)
-        x=returns.crypto
-        color=np.array(['rgb(255,255,255)']*x.shape[0])
-        color[x<0]='rgb(255,0, 0)'
-        color[x>=0]='rgb(0, 255, 0)'
-        fig.add_trace(go.Bar(
-            y=returns.index,
-            x=x,
-            orientation='h',
-            showlegend=False,
-            marker = dict(color=color.tolist()),
-            name= "Profit per strategy",
-            visible=False),
-            row=2, col=1)
-        fig.update_layout(template = "plotly_dark",
-                          autosize=False,
-                          width=1000,
-                          height=1000,)
-        
-        visible = [False] * (7*index) + [True]*7 + [False]*(7*(size-index-1))
-        buttons.append(
-            dict(
-                label=plotTicker,
-                method="update",
-                args=[{"visible": visible}, {"title": plotTicker}])
-            )
-        
-        
-        
-        return fig, buttons
-    
-    def run(tickers, size):
-        return tickers
-    
-    def get_returns(self, df, tickers):
-        col  = [col for col in df.columns if 'signal' in col]
-        strat_totals = []
-        for strategy in col:
-            df_temp = 0
-            df_temp = df.loc[df[strategy].notnull()]
-            df_temp.loc[:, 'traded_value'] = np.where(df_temp[strategy] == "buy", df_temp['Low'] * -1, df_temp['High'])
-            add = df_temp.iloc[-1, df.columns.get_loc('Close')] if df_temp.iloc[-1, df.columns.get_loc(strategy)] == 'buy' else 0
-            portfolio_val = df_temp["traded_value"].sum() + add
-            strat_totals.append(portfolio_val)
-        return pd.DataFrame(strat_totals, columns=["crypto"], index=["bollinger","moving average","rsi"])
-
-class Analysis:
-    
-    def __init__(self):
-        
-        self.path = os.getcwd() + '/'
-        self.extension = 'csv'
-        self.files = self.getFiles()
-        
-    def getFiles(self):
-        return glob.glob('*.{}'.format(self.extension))
-    
-    def computeStrategyReturns(self):
-        
-        for file in self.files:
-        
-            df = pd.read_csv(self.path + file)
-            col  = [col for col in df.columns if 'signal' in col]
-            
-            for strategy in col:
-                
-                df_temp = df.loc[df[strategy].notnull()]
-                df_temp.loc[:, 'traded_value'] = np.where(df_temp[strategy] == "buy", df_temp['Low'] * -1, df_temp['High'])
-                add = df_temp.iloc[-1, df.columns.get_loc('Close')] if df_temp.iloc[-1, df.columns.get_loc(strategy)] == 'buy' else 0 
-                print(f'currency : {file}, \n strategy : {strategy} : \
-                      \n cash : # {df_temp["traded_value"].sum()} \
-                      \n curr. position : # {add} \
-                      \n total portfolio value : # {df_temp["traded_value"].sum() + add}')
-                         
-
-   
-def main():
-    
-    data = Data()
-    tickers = data.getSymbols()
-    size = 50
-    #On prend juste les 10 premiers pour le moment 
-    df = data.getData(tickers[0])
-    df = data.computeIndicators(df)
-    df = data.computeStrategies(df)
-    returns = data.get_returns(df, tickers[0])
-    figure, buttons=data.defineFig(df, returns, tickers[0], size)
-    data.exportData(df, tickers[0])
-    
-    liste_df = [df]
-    liste_returns = [returns]
-    for i in range(1, size):
-        
-        df = data.getData(tickers[i])
-        df = data.computeIndicators(df)
-        df = data.computeStrategies(df)
-        figure, buttons=data.addNew(df, returns, tickers[i], figure, size, i, buttons)
-        data.exportData(df, tickers[i])
-        liste_df.append(df)
-        returns = data.get_returns(df, tickers)
-        liste_returns.append(returns)
-    figure.update_layout(updatemenus=[dict(active=0, buttons=tuple(buttons))])
-
-    analysis_files = Analysis()
-    analysis_files.computeStrategyReturns()
-    return tickers, liste_df , liste_returns, figure
-
-if __name__ == '__main__':
-    tickers, liste_df, df_returns, figure = main()
-    # plot(figure)
-
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import os 
+import pandas as pd
+
+from signals import signalState, decodeSignals, encodeSignals, lastState
+from store import Store
+from providers import BAR_COLUMNS, YahooProvider
+from pipeline import RATE, Ingestion
+from network import CachedSession
+from indicators import IndicatorState, INDICATOR_COLUMNS
+from panel import Panel
+from registry import ENGINE, requiredColumns
+from snapshot import Snapshot
+from universe import UniverseLoader
+from ledger import EquityState, loadStates, saveStates
+from screener import ScreenerIndex, SCREENER_FILE
+from compact import CompactFrames
+from instrument import instrumented
+
+from plotly.offline import plot
+import plotly.graph_objs as go
+import plotly.io as pio
+pio.templates
+
+from plotly.subplots import make_subplots
+
+#strategies behind each signal column, in the order of computeStrategies
+STRATEGY_NAMES = {
+    'signal_bo': "bollinger",
+    'signal_ma': "moving average",
+    'signal_rsi': "rsi",
+}
+
+def strategyTotals(df, strategy):
+    
+    #cash and open position of a strategy : buys pay the Low, sells receive
+    #the High, a position still open is valued at the Close of its buy bar
+    buys = np.asarray(df[strategy] == "buy", dtype=bool)
+    sells = np.asarray(df[strategy] == "sell", dtype=bool)
+    cash = df['High'].values[sells].sum() - df['Low'].values[buys].sum()
+    traded = np.flatnonzero(buys | sells)
+    position = df['Close'].values[traded[-1]] if len(traded) and buys[traded[-1]] else 0
+    return cash, position
+
+#line overlays of the price chart and the name of their trace
+OVERLAY_TRACES = {
+    '20_sma': "20 SMA",
+    '50_sma': "50 SMA",
+    '200_sma': "200 SMA",
+    'low_boll': "Lower Bollinger Band",
+    'high_boll': "High Bollinger Band",
+}
+
+class Data:
+    def __init__(self, data_dir=None, provider=None, session=None):
+
+        self.base = 'https://finance.yahoo.com/'
+        self.endpoints = {
+            "klines": '/api/v3/klines',
+            "cryptocurrencies": '/cryptocurrencies',
+        }
+        self.startdate = datetime(2000, 1, 1)
+        self.enddate = datetime.today()
+        self.path = os.getcwd() + '/'
+        self.data_dir = data_dir if data_dir is not None else self.path + 'data'
+        self.store = Store(self.data_dir)
+        #every download goes through this session (pooled, cached on disk)
+        self.session = session if session is not None else CachedSession(os.path.join(self.data_dir, 'http_cache'))
+        self.provider = provider if provider is not None else YahooProvider(self.session)
+        self.rsi_period = 14
+        #indicator columns read by the strategies and the price chart, the
+        #others are only computed when asked for
+        self.indicator_columns = requiredColumns()
+
+
+    @instrumented
+    def getSymbols(self, count=50):
+
+        #the count most traded symbols of the screener, paged and cached on disk
+        url = self.base + self.endpoints["cryptocurrencies"]
+        loader = UniverseLoader(url, os.path.join(self.data_dir, 'universe.json'), self.session)
+        return loader.load(count)
+    
+    @instrumented
+    def getData(self, tickers, incremental=False):
+        
+        last = self.store.lastDate(tickers) if incremental else None
+        if last is None:
+            return self.provider.getBars(tickers, self.startdate, self.enddate)
+        
+        #only ask for the bars since the last stored date, which is fetched
+        #again since it may have been stored before the day was over
+        stored = self.store.read(tickers, columns=BAR_COLUMNS)
+        new = self.provider.getBars(tickers, last, self.enddate)
+        df = pd.concat([stored, new[BAR_COLUMNS]], ignore_index=True)
+        df = df.drop_duplicates(subset='Date', keep='last').sort_values('Date')
+        return df.reset_index(drop=True)
+    
+    @instrumented
+    def computeIndicators(self, df, columns=None, key=None):
+    
+        #columns (those the strategies and the chart need by default) from the
+        #indicator registry, which computes the shared cumulative sums once;
+        #with a key (the ticker) the results are memoized for the same bars
+        #and params
+        columns = self.indicator_columns if columns is None else columns
+        values = ENGINE.compute(df, columns, {'rsi_period': self.rsi_period}, key)
+        for col in columns:
+            df[col] = values[col] if key is None else values[col].copy()
+        
+        return df
+    
+    @instrumented
+    def updateIndicators(self, ticker, bars):
+        
+        #same columns as computeIndicators for bars newer than the stored ones,
+        #from the saved incremental state instead of the whole history
+        path = self.store.statePath(ticker, 'indicators')
+        last = self.store.lastDate(ticker)
+        state = IndicatorState.load(path) if os.path.exists(path) else None
+        if state is None or last is None or pd.Timestamp(state.last) != last:
+            history = self.store.read(ticker, columns=['Close']) if last is not None else bars.iloc[:0]
+            state = IndicatorState.fromFrame(history, self.rsi_period)
+        
+        if last is not None:
+            bars = bars.loc[bars['Date'] > last]
+        rows = [state.update(date, close) for date, close in zip(bars['Date'], bars['Close'])]
+        state.save(path)
+        
+        df = bars.reset_index(drop=True)
+        rows = pd.DataFrame(rows, columns=INDICATOR_COLUMNS)[self.indicator_columns]
+        return pd.concat([df, rows], axis=1)
+    
+    @instrumented
+    def stratMA(self, df, initial=0):
+        
+        entry = df['20_sma'].values > df['50_sma'].values
+        exit = df['20_sma'].values < df['50_sma'].values
+        df['signal_ma'] = decodeSignals(signalState(entry, exit, initial))
+                
+        return df
+    
+    @instrumented
+    def stratBO(self, df, initial=0):
+        
+        entry = df['low_boll'].values > df['Close'].values
+        exit = df['high_boll'].values < df['Close'].values
+        df['signal_bo'] = decodeSignals(signalState(entry, exit, initial))
+                
+        return df
+    
+    @instrumented
+    def stratRSI(self, df, initial=0):
+        
+        entry = df['rsi'].values < 40
+        exit = df['rsi'].values > 60
+        df['signal_rsi'] = decodeSignals(signalState(entry, exit, initial))
+                
+        return df
+    
+    @instrumented
+    def computeStrategies(self, df, initial=None):
+        
+        #initial : position of each signal column before the first bar
+        initial = initial if initial is not None else {}
+        df = self.stratBO(df, initial.get('signal_bo', 0))
+        df = self.stratMA(df, initial.get('signal_ma', 0))
+        df = self.stratRSI(df, initial.get('signal_rsi', 0))
+        
+        return df
+    
+    @instrumented
+    def computeUniverse(self, frames):
+        
+        #computeIndicators and computeStrategies for all the tickers at once
+        panel = Panel(frames)
+        panel.computeIndicators(self.rsi_period, self.indicator_columns)
+        panel.computeStrategies()
+        return panel.frames()
+    
+    @instrumented
+    def extendFrame(self, ticker, bars):
+        
+        #stored frame of a ticker extended with the bars newer than its last
+        #stored one : indicators from the saved state (updateIndicators) and
+        #signals with the stored positions carried over, the new rows being
+        #appended to the store. None when the stored frame cannot be extended
+        #(not stored, other columns, last stored bar revised by the download)
+        #or when a full recompute would give other signals (bandsAgree)
+        last = self.store.lastDate(ticker)
+        if last is None:
+            return None
+        signals = [col for col in self.store.manifest[ticker]['columns'] if 'signal' in col]
+        expected = list(bars.columns) + list(self.indicator_columns) + signals
+        if sorted(self.store.manifest[ticker]['columns']) != sorted(expected) or not signals:
+            return None
+        stored = self.store.read(ticker, start=last, end=last, columns=['Close'])['Close'].values
+        fetched = bars.loc[bars['Date'] == last, 'Close'].values
+        if len(fetched) and not np.allclose(stored[-1:], fetched[-1:], equal_nan=True):
+            return None
+        
+        new = self.updateIndicators(ticker, bars)
+        if len(new):
+            positions = {col: lastState(self.store.column(ticker, col)) for col in signals}
+            new = self.computeStrategies(new, positions)
+            if 'signal_bo' in signals and not self.bandsAgree(ticker, new):
+                return None
+            self.store.append(ticker, new[list(self.store.manifest[ticker]['columns'])])
+        return self.store.read(ticker)
+    
+    def bandsAgree(self, ticker, new):
+        
+        #the bands of the stored bars keep the width they were computed with,
+        #a full recompute uses the width of the whole history for every bar :
+        #True when that width leaves the breakout signals of the stored bars
+        #(so the positions carried to the new ones) unchanged
+        width = ((new['high_boll'] - new['low_boll']) / 2).dropna()
+        if not len(width):
+            return True
+        close = self.store.column(ticker, 'Close')
+        mid = (self.store.column(ticker, 'low_boll') + self.store.column(ticker, 'high_boll')) / 2
+        codes = signalState(mid - width.values[-1] > close, mid + width.values[-1] < close)
+        return np.array_equal(codes, self.store.column(ticker, 'signal_bo'))
+    
+    @instrumented
+    def exportData(self, df, ticker):
+        self.store.write(ticker, df)
+    
+    #Move this function
+    @instrumented
+    def defineFig(self, df, returns, plotTicker, size, gl=False):
+        
+        #gl draws the overlay lines with WebGL instead of SVG
+        scatter = go.Scattergl if gl else go.Scatter
+        layout = go.Layout()
+        fig = go.Figure(layout=layout)
+        
+        fig = make_subplots(
+            rows=2, cols=1,
+            column_widths=[0.6],
+            row_heights=[1, 0.3],
+            subplot_titles=("Prices", "Profit per strategy"),
+            vertical_spacing = 0.3,
+            specs=[[{"type": "scatter"}],
+                   [{"type": "bar"}]])
+        fig.add_trace(
+            go.Candlestick(
+            x=df['Date'],
+            open=df['Open'],
+            close=df['Close'],
+            high=df['High'],
+            low=df['Low'],
+            name="Candlesticks"),
+            row=1, col=1)
+        fig.add_trace(
+            scatter(
+            x=df['Date'],
+            y=df['20_sma'],
+            name="20 SMA",
+            line=dict(color=('rgba(102, 207, 255, 50)'))),
+            row=1, col=1)
+        fig.add_trace(scatter(
+            x=df['Date'],
+            y=df['50_sma'],
+            name="50 SMA",
+            line=dict(color=('rgba(255, 207, 102, 50)'))),
+            row=1, col=1)
+        fig.add_trace(scatter(
+            x=df['Date'],
+            y=df['200_sma'],
+            name="200 SMA",
+            line=dict(color=('rgba(207, 255, 102, 50)'))),
+            row=1, col=1)
+        fig.add_trace(scatter(
+            x=df['Date'],
+            y=df['low_boll'],
+            name="Lower Bollinger Band",
+            line=dict(color=('rgba(50, 102, 255, 50)'))),
+            row=1, col=1)
+        fig.add_trace(scatter(
+            x=df['Date'],
+            y=df['high_boll'],
+            name="High Bollinger Band",
+            line=dict(color=('rgba(50, 102, 255, 50)'))),
+            row=1, col=1)
+        x=returns.crypto
+        color=np.array(['rgb(255,255,255)']*x.shape[0])
+        color[x<0]='rgb(255,0, 0)'
+        color[x>0]='rgb(0, 255, 0)'
+        fig.add_trace(go.Bar(
+            y=returns.index,
+            x=x,
+            orientation='h',
+            marker = dict(color=color.tolist()),
+            showlegend=False,
+            name= "Profit per strategy"), 
+            row=2, col=1)
+        
+        visible = [True] * 7 + [False] * 7 * (size-1)
+        buttons = list()
+        buttons.append(dict(label=plotTicker,
+                            method="update",
+                            args=[{"visible": visible},
+                                   {"title": plotTicker}]))
+        return fig, buttons
+        
+    @instrumented
+    def tickerFigure(self, df, returns, plotTicker, overlays=None, gl=False):
+        
+        #figure of a single ticker, built on demand by the dash app
+        #overlays optionally maps columns of OVERLAY_TRACES to (x, y) points
+        #drawn instead of the df columns (decimated lines for instance)
+        fig, buttons = self.defineFig(df, returns, plotTicker, 1, gl)
+        for col, (x, y) in (overlays or {}).items():
+            fig.update_traces(x=x, y=y, selector=dict(name=OVERLAY_TRACES[col]))
+        fig.update_layout(template = "plotly_dark",
+                          title = plotTicker,
+                          autosize=False,
+                          width=1000,
+                          height=1000,)
+        return fig
+        
+    @instrumented
+    def addNew(self, df, returns, plotTicker, prevFig, size, index, buttons, gl=False):
+        scatter = go.Scattergl if gl else go.Scatter
+        fig = prevFig
+        fig.add_trace(
+            go.Candlestick(
+            x=df['Date'],
+            open=df['Open'],
+            close=df['Close'],
+            high=df['High'],
+            low=df['Low'],
+            name="Candlesticks",
+            visible = False),
+            row=1, col=1)
+        fig.add_trace(
+            scatter(
+            x=df['Date'],
+            y=df['20_sma'],
+            name="20 SMA",
+            visible = False,
+            line=dict(color=('rgba(102, 207, 255, 50)'))),
+            row=1, col=1)
+        fig.add_trace(scatter(
+            x=df['Date'],
+            y=df['50_sma'],
+            name="50 SMA",
+            visible = False,
+            line=dict(color=('rgba(255, 207, 102, 50)'))),
+            row=1, col=1)
+        fig.add_trace(scatter(
+            x=df['Date'],
+            y=df['200_sma'],
+            name="200 SMA",
+            visible = False,
+            line=dict(color=('rgba(207, 255, 102, 50)'))),
+            row=1, col=1)
+        fig.add_trace(scatter(
+            x=df['Date'],
+            y=df['low_boll'],
+            name="Lower Bollinger Band",
+            visible = False,
+            line=dict(color=('rgba(50, 102, 255, 50)'))),
+            row=1, col=1)
+        fig.add_trace(scatter(
+            x=df['Date'],
+            y=df['high_boll'],
+            name="High Bollinger Band",
+            visible = False,
+            line=dict(color=('rgba(50, 102, 255, 50)'))),
+            row=1, col=1)
+        x=returns.crypto
+        color=np.array(['rgb(255,255,255)']*x.shape[0])
+        color[x<0]='rgb(255,0, 0)'
+        color[x>=0]='rgb(0, 255, 0)'
+        fig.add_trace(go.Bar(
+            y=returns.index,
+            x=x,
+            orientation='h',
+            showlegend=False,
+            marker = dict(color=color.tolist()),
+            name= "Profit per strategy",
+            visible=False),
+            row=2, col=1)
+        fig.update_layout(template = "plotly_dark",
+                          autosize=False,
+                          width=1000,
+                          height=1000,)
+        
+        visible = [False] * (7*index) + [True]*7 + [False]*(7*(size-index-1))
+        buttons.append(
+            dict(
+                label=plotTicker,
+                method="update",
+                args=[{"visible": visible}, {"title": plotTicker}])
+            )
+        
+        
+        
+        return fig, buttons
+    
+    def run(tickers, size):
+        return tickers
+    
+    @instrumented
+    def equityMetrics(self, ticker, df):
+        
+        #return / volatility / sharpe / max drawdown of each strategy, the
+        #saved equity state is carried over the bars newer than its last one
+        path = self.store.statePath(ticker, 'equity')
+        states = loadStates(path) if os.path.exists(path) else {}
+        metrics = {}
+        for strategy in [col for col in df.columns if 'signal' in col]:
+            state = states.get(strategy)
+            if state is None or state.last is None or not (df['Date'] == pd.Timestamp(state.last)).any():
+                state = EquityState.fromFrame(df, strategy)
+            else:
+                new = df.loc[df['Date'] > pd.Timestamp(state.last)]
+                codes = encodeSignals(new[strategy].values)
+                for row, code in zip(new[['Date', 'High', 'Low', 'Close']].itertuples(index=False), codes):
+                    state.update(row.Date, row.High, row.Low, row.Close, code)
+            states[strategy] = state
+            metrics[STRATEGY_NAMES[strategy]] = state.metrics()
+        saveStates(states, path)
+        return metrics
+    
+    @instrumented
+    def get_returns(self, df, tickers):
+        col  = [col for col in df.columns if 'signal' in col]
+        strat_totals = []
+        for strategy in col:
+            cash, add = strategyTotals(df, strategy)
+            portfolio_val = cash + add
+            strat_totals.append(portfolio_val)
+        return pd.DataFrame(strat_totals, columns=["crypto"], index=[STRATEGY_NAMES[c] for c in col])
+
+class Analysis:
+    
+    def __init__(self, data_dir=None, workers=8):
+        
+        self.path = os.getcwd() + '/'
+        self.data_dir = data_dir if data_dir is not None else self.path + 'data'
+        self.store = Store(self.data_dir)
+        self.workers = workers
+        self.cache_path = os.path.join(self.data_dir, 'results_cache.json')
+        self.files = self.getFiles()
+        
+    def getFiles(self):
+        return self.store.tickers()
+    
+    def fingerprint(self, df):
+        #hash of the columns used by the results of an in-memory frame
+        h = hashlib.sha1()
+        for col in ['High', 'Low', 'Close'] + [c for c in df.columns if 'signal' in c]:
+            values = encodeSignals(df[col].values) if 'signal' in col else df[col].values
+            h.update(col.encode())
+            h.update(np.ascontiguousarray(values, dtype=values.dtype).tobytes())
+        return h.hexdigest()
+    
+    @instrumented
+    def tickerResults(self, ticker, df=None):
+        
+        if df is None:
+            columns = [c for c in self.store.manifest[ticker]['columns'] if 'signal' in c]
+            df = self.store.read(ticker, columns=['High', 'Low', 'Close'] + columns)
+        rows = []
+        for strategy in [c for c in df.columns if 'signal' in c]:
+            cash, position = strategyTotals(df, strategy)
+            rows.append({'ticker': ticker, 'strategy': STRATEGY_NAMES.get(strategy, strategy),
+                         'cash': float(cash), 'position': float(position),
+                         'portfolio_value': float(cash + position)})
+        return rows
+    
+    @instrumented
+    def aggregate(self, frames=None):
+        
+        #one row per ticker and strategy, from the in-memory frames when given
+        #and from the store otherwise; tickers whose inputs did not change since
+        #the last call are taken from the cache without being read
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        else:
+            cache = {}
+        
+        if frames is None:
+            fingerprints = {ticker: self.store.fingerprint(ticker) for ticker in self.files}
+        else:
+            fingerprints = {ticker: self.fingerprint(df) for ticker, df in frames.items()}
+        stale = [t for t, fp in fingerprints.items() if cache.get(t, {}).get('fingerprint') != fp]
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = pool.map(lambda t: self.tickerResults(t, None if frames is None else frames[t]), stale)
+            for ticker, rows in zip(stale, results):
+                cache[ticker] = {'fingerprint': fingerprints[ticker], 'rows': rows}
+        
+        tmp = self.cache_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp, self.cache_path)
+        
+        rows = [row for ticker in fingerprints for row in cache[ticker]['rows']]
+        return pd.DataFrame(rows, columns=['ticker', 'strategy', 'cash', 'position', 'portfolio_value'])
+    
+    @instrumented
+    def computeStrategyReturns(self, frames=None):
+        
+        results = self.aggregate(frames)
+        for row in results.itertuples():
+            print(f'currency : {row.ticker}, \n strategy : {row.strategy} : \
+                  \n cash : # {row.cash} \
+                  \n curr. position : # {row.position} \
+                  \n total portfolio value : # {row.portfolio_value}')
+        return results
+
+   
+def main(workers=8, buildFigure=True, compact=False, cache_only=False, rate=RATE):
+    
+    #cache_only reruns from the responses cached by a previous run, offline,
+    #rate : requests per second to each host
+    data_dir = os.getcwd() + '/data'
+    data = Data(data_dir, session=CachedSession(os.path.join(data_dir, 'http_cache'), workers, cache_only=cache_only))
+    size = 50
+    tickers = data.getSymbols(size)
+    
+    #download and process the tickers concurrently, failed ones are skipped
+    frames, errors = Ingestion(data, workers=workers, rate=rate).run(tickers[:size])
+    if not frames:
+        #keep the last snapshot, the caller retries later
+        raise RuntimeError(f'none of the {len(tickers[:size])} tickers could be downloaded')
+    tickers = list(frames)
+    size = len(tickers)
+    if compact:
+        frames = CompactFrames(frames)
+    
+    liste_df = frames if compact else []
+    liste_returns = []
+    metrics = {}
+    #latest state of every ticker for the screener, updated with the new bars
+    screener_path = os.path.join(data.data_dir, SCREENER_FILE)
+    screener = ScreenerIndex.load(screener_path)
+    figure = None
+    for i, ticker in enumerate(tickers):
+        
+        df = frames[ticker]
+        returns = data.get_returns(df, ticker)
+        metrics[ticker] = data.equityMetrics(ticker, df)
+        screener.updateFrame(ticker, df)
+        if buildFigure and i == 0:
+            figure, buttons = data.defineFig(df, returns, ticker, size)
+        elif buildFigure:
+            figure, buttons = data.addNew(df, returns, ticker, figure, size, i, buttons)
+        if not compact:
+            liste_df.append(df)
+        liste_returns.append(returns)
+    if figure is not None:
+        figure.update_layout(updatemenus=[dict(active=0, buttons=tuple(buttons))])
+    
+    screener.save(screener_path)
+    #results the dashboard starts from
+    Snapshot(data.store, tickers, frames, dict(zip(tickers, liste_returns)), metrics=metrics).save()
+
+    analysis_files = Analysis()
+    analysis_files.computeStrategyReturns(frames)
+    return tickers, liste_df , liste_returns, figure
+
+if __name__ == '__main__':
+    tickers, liste_df, df_returns, figure = main()
+    # plot(figure)
+
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_COLUMNS
+from providers import BAR_COLUMNS
+from signals import encodeSignals, BUY, SELL
+
+SIGNAL_CATEGORIES = ["buy", "sell"]
+
+
+def signalCategorical(codes):
+    # int8 signal codes -> categorical column ("buy" / "sell" / NaN) that
+    # keeps the codes as int8 and compares like the object column
+    codes = np.asarray(codes)
+    categories = np.full(codes.shape, -1, dtype=np.int8)
+    categories[codes == BUY] = 0
+    categories[codes == SELL] = 1
+    return pd.Categorical.from_codes(categories, SIGNAL_CATEGORIES)
+
+
+class CompactFrames:
+    # Compact in-memory copy of the per-ticker frames of the universe.
+    # Dates are kept once in a shared index (a ticker whose bars are contiguous
+    # in it only keeps a slice), signals as int8 codes and the indicators as
+    # float32 when asked. frames[ticker] or frames[i] rebuilds a regular frame
+    # on demand so get_returns and the plotting code work unchanged; iterating
+    # yields the frames in order like the liste_df list.
+    # prices32=True (opt-in) also keeps the prices and volumes as float32;
+    # they are rebuilt as float64 so the returns are still summed in float64,
+    # only rounded to float32 precision (about 7 significant digits).
+
+    def __init__(self, frames, float32=True, prices32=False):
+
+        self.tickers = list(frames)
+        self.float32 = float32
+        self.prices32 = prices32
+        dates = [df['Date'].values.astype('datetime64[ns]') for df in frames.values()]
+        self.dates = pd.DatetimeIndex(np.unique(np.concatenate(dates)) if dates else [])
+        self.rows = {}
+        self.columns = {}
+        for ticker, df, d in zip(self.tickers, frames.values(), dates):
+            rows = np.searchsorted(self.dates.values, d).astype(np.int32)
+            contiguous = len(rows) == 0 or rows[-1] - rows[0] == len(rows) - 1
+            self.rows[ticker] = slice(int(rows[0]), int(rows[-1]) + 1) if len(rows) and contiguous else rows
+            columns = {}
+            for col in df.columns:
+                if col == 'Date':
+                    continue
+                values = df[col].values
+                if 'signal' in col:
+                    values = encodeSignals(values)
+                elif float32 and col in INDICATOR_COLUMNS or prices32 and col in BAR_COLUMNS:
+                    values = values.astype(np.float32)
+                columns[col] = np.ascontiguousarray(values)
+            self.columns[ticker] = columns
+
+    def frame(self, ticker):
+        data = {'Date': self.dates[self.rows[ticker]]}
+        for col, values in self.columns[ticker].items():
+            if 'signal' in col:
+                values = signalCategorical(values)
+            elif col in BAR_COLUMNS:
+                values = values.astype(np.float64, copy=False)
+            data[col] = values
+        return pd.DataFrame(data)
+
+    def encoded(self, ticker):
+        # columns of a ticker as Store.writeColumns takes them (int64 dates,
+        # int8 signal codes), without building a frame
+        columns = {'Date': self.dates.values[self.rows[ticker]].view('int64')}
+        columns.update(self.columns[ticker])
+        return columns
+
+    def __getitem__(self, key):
+        return self.frame(self.tickers[key] if isinstance(key, (int, np.integer)) else key)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __iter__(self):
+        return (self.frame(ticker) for ticker in self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self.columns
+
+    def keys(self):
+        return list(self.tickers)
+
+    def values(self):
+        return iter(self)
+
+    def items(self):
+        return ((ticker, self.frame(ticker)) for ticker in self.tickers)
+
+    @property
+    def nbytes(self):
+        total = self.dates.values.nbytes
+        for ticker in self.tickers:
+            rows = self.rows[ticker]
+            total += 0 if isinstance(rows, slice) else rows.nbytes
+            total += sum(values.nbytes for values in self.columns[ticker].values())
+        return total
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+#levels of the OHLC pyramid, from the finest to the coarsest
+LEVELS = ['D', 'W', 'M', 'Q']
+
+
+def resampleOHLC(df, level):
+    # weekly / monthly / quarterly bars of a daily frame; the overlay columns
+    # (SMAs, bands, ...) keep their value on the last day of each period
+    if level == 'D':
+        return df
+    groups = df.groupby(df['Date'].dt.to_period(level).values, sort=True)
+    agg = {col: 'last' for col in df.columns}
+    agg.update({'Date': 'first', 'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last'})
+    if 'Volume' in df.columns:
+        agg['Volume'] = 'sum'
+    return groups.agg(agg).reset_index(drop=True)
+
+
+def buildPyramid(df):
+    return {level: resampleOHLC(df, level) for level in LEVELS}
+
+
+def chooseLevel(pyramid, start=None, end=None, max_points=2000):
+    # finest level with at most max_points bars between start and end
+    for level in LEVELS:
+        bars = window(pyramid[level], start, end)
+        if len(bars) <= max_points:
+            return level, bars
+    return level, bars
+
+
+def window(df, start=None, end=None):
+    mask = np.ones(len(df), dtype=bool)
+    if start is not None:
+        mask &= (df['Date'] >= start).values
+    if end is not None:
+        mask &= (df['Date'] <= end).values
+    return df.loc[mask]
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets decimation of a line to n_out points
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    keep = ~np.isnan(y)
+    x, y = x[keep], y[keep]
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    xf = x.astype('datetime64[ns]').astype('int64').astype(float) if x.dtype.kind == 'M' else x.astype(float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        #average point of the next bucket
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = xf[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((xf[a] - avg_x) * (y[lo:hi] - y[a]) - (xf[a] - xf[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+def visibleRange(relayout):
+    # x range of the price chart from the relayoutData of a dcc.Graph,
+    # (None, None) when autoranged
+    if not relayout or relayout.get('xaxis.autorange'):
+        return None, None
+    if 'xaxis.range[0]' in relayout:
+        return pd.Timestamp(relayout['xaxis.range[0]']), pd.Timestamp(relayout['xaxis.range[1]'])
+    if 'xaxis.range' in relayout:
+        return pd.Timestamp(relayout['xaxis.range'][0]), pd.Timestamp(relayout['xaxis.range'][1])
+    return None, None
+
+
+def roundSignificant(values, digits=6):
+    # values rounded to a number of significant digits, NaN kept
+    values = np.asarray(values, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    scale = 10.0 ** np.where(np.isfinite(magnitude), digits - 1 - magnitude, 0)
+    return np.round(values * scale) / scale
+
+
+def jsonList(values):
+    return [None if v != v else v for v in values.tolist()]
+
+
+def browserData(df, returns, strategies):
+    # Compact data of one ticker for the clientside charts (assets/charts.js):
+    # bar times as days from the first bar, prices to 6 significant digits,
+    # the bar indexes of the buys / sells of each signal column and the
+    # bollinger offset. The SMAs and bands are rebuilt in the browser.
+    dates = df['Date'].values.astype('datetime64[ms]').astype('int64')
+    start = int(dates[0]) if len(dates) else 0
+    offset = (df['50_sma'] - df['low_boll']).values.astype(float)
+    offset = offset[~np.isnan(offset)]
+    times = (dates - start) / 86400000.0
+    times = times.astype('int64') if np.all(times == np.floor(times)) else times.round(6)
+    signals = {}
+    for col, name in strategies.items():
+        values = df[col].values
+        signals[name] = {side: np.flatnonzero(np.asarray(values == side, dtype=bool)).tolist()
+                         for side in ("buy", "sell")}
+    return {
+        'start': start,
+        't': times.tolist(),
+        'o': jsonList(roundSignificant(df['Open'].values)),
+        'h': jsonList(roundSignificant(df['High'].values)),
+        'l': jsonList(roundSignificant(df['Low'].values)),
+        'c': jsonList(roundSignificant(df['Close'].values)),
+        'band': float(offset[0]) if len(offset) else None,
+        'signals': signals,
+        'returns': {strategy: float(value) for strategy, value in returns['crypto'].items()},
+    }
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+INDICATOR_COLUMNS = ['20_sma', '50_sma', '200_sma', 'low_boll', 'high_boll',
+                     'daily_returns', 'monthly_returns', 'annual_returns', 'rsi']
+
+
+class IndicatorState:
+    # Incremental version of Data.computeIndicators.
+    # Holds the last closes, the rolling sums of the moving averages, the RSI
+    # gain/loss windows and the running moments of the 200 SMA used for the
+    # bollinger width, so each new bar is processed in O(1).
+    # The bands of a new bar match a batch run over the whole history; the
+    # bands of older bars used the width known at the time they were added.
+
+    windows = (20, 50, 200)
+    lags = {'daily_returns': 1, 'monthly_returns': 31, 'annual_returns': 365}
+
+    def __init__(self, rsi_period=14, band_width=0.5):
+
+        self.rsi_period = rsi_period
+        self.band_width = band_width
+        self.count = 0
+        self.last = None
+        self.closes = deque(maxlen=max(self.lags.values()) + 1)
+        self.sums = {w: 0.0 for w in self.windows}
+        self.ups = deque(maxlen=rsi_period)
+        self.downs = deque(maxlen=rsi_period)
+        self.up_sum = 0.0
+        self.down_sum = 0.0
+        #count / mean / sum of squared deviations of the 200 SMA (Welford)
+        self.sma_moments = [0, 0.0, 0.0]
+
+    @classmethod
+    def fromFrame(cls, df, rsi_period=14, band_width=0.5):
+        # state after the bars of df, built with array operations
+        state = cls(rsi_period, band_width)
+        closes = df['Close'].values.astype(float)
+        n = len(closes)
+        state.count = n
+        state.last = str(pd.Timestamp(df['Date'].iloc[-1])) if n else None
+        state.closes.extend(closes[-state.closes.maxlen:])
+        state.sums = {w: float(closes[-w:].sum()) for w in cls.windows}
+
+        delta = np.diff(closes, n=2)[-rsi_period:]
+        state.ups.extend(np.where(delta > 0, delta, 0.0))
+        state.downs.extend(np.where(delta < 0, -delta, 0.0))
+        state.up_sum = float(sum(state.ups))
+        state.down_sum = float(sum(state.downs))
+
+        sma = pd.Series(closes).rolling(200).mean().dropna().values
+        if len(sma):
+            mean = sma.mean()
+            state.sma_moments = [len(sma), float(mean), float(((sma - mean) ** 2).sum())]
+        return state
+
+    def bandOffset(self):
+        count, mean, m2 = self.sma_moments
+        return self.band_width * math.sqrt(m2 / count) if count else np.nan
+
+    def update(self, date, close):
+        # add one bar and return its indicator values
+        close = float(close)
+        self.closes.append(close)
+        self.count += 1
+        self.last = str(pd.Timestamp(date))
+        n = self.count
+        row = {}
+
+        #moving averages
+        for w in self.windows:
+            self.sums[w] += close
+            if n > w:
+                self.sums[w] -= self.closes[-w - 1]
+            row[f'{w}_sma'] = self.sums[w] / w if n >= w else np.nan
+
+        #bollinger bands
+        if n >= 200:
+            count, mean, m2 = self.sma_moments
+            count += 1
+            delta = row['200_sma'] - mean
+            mean += delta / count
+            m2 += delta * (row['200_sma'] - mean)
+            self.sma_moments = [count, mean, m2]
+        row['low_boll'] = row['50_sma'] - self.bandOffset()
+        row['high_boll'] = row['50_sma'] + self.bandOffset()
+
+        #returns
+        for col, lag in self.lags.items():
+            row[col] = close / self.closes[-lag - 1] - 1 if n > lag else np.nan
+
+        #RSI, on the second difference of the closes like computeIndicators
+        row['rsi'] = np.nan
+        if n >= 3:
+            delta = close - 2 * self.closes[-2] + self.closes[-3]
+            if len(self.ups) == self.rsi_period:
+                self.up_sum -= self.ups[0]
+                self.down_sum -= self.downs[0]
+            self.ups.append(max(delta, 0.0))
+            self.downs.append(max(-delta, 0.0))
+            self.up_sum += self.ups[-1]
+            self.down_sum += self.downs[-1]
+            if len(self.ups) == self.rsi_period:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    rs = np.float64(self.up_sum) / np.float64(self.down_sum)
+                    row['rsi'] = float(100.0 - (100.0 / (1.0 + rs)))
+
+        return row
+
+    def toDict(self):
+        return {
+            'rsi_period': self.rsi_period,
+            'band_width': self.band_width,
+            'count': self.count,
+            'last': self.last,
+            'closes': list(self.closes),
+            'sums': {str(w): s for w, s in self.sums.items()},
+            'ups': list(self.ups),
+            'downs': list(self.downs),
+            'up_sum': self.up_sum,
+            'down_sum': self.down_sum,
+            'sma_moments': self.sma_moments,
+        }
+
+    @classmethod
+    def fromDict(cls, d):
+        state = cls(d['rsi_period'], d['band_width'])
+        state.count = d['count']
+        state.last = d['last']
+        state.closes.extend(d['closes'])
+        state.sums = {int(w): s for w, s in d['sums'].items()}
+        state.ups.extend(d['ups'])
+        state.downs.extend(d['downs'])
+        state.up_sum = d['up_sum']
+        state.down_sum = d['down_sum']
+        state.sma_moments = d['sma_moments']
+        return state
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.toDict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.fromDict(json.load(f))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+#switched on with INSTRUMENT=1 (INSTRUMENT_MEMORY=1 adds the memory peaks)
+#or enable(); when off an instrumented call costs one flag check
+ENABLED = os.environ.get('INSTRUMENT', '0') not in ('', '0')
+MEMORY = os.environ.get('INSTRUMENT_MEMORY', '0') not in ('', '0')
+
+if ENABLED and MEMORY:
+    tracemalloc.start()
+
+#arguments holding the ticker a call works on
+TICKER_ARGS = ('ticker', 'tickers', 'plotTicker')
+
+local = threading.local()
+
+#memory spans open in every thread. tracemalloc peaks are process wide, so a
+#span overlapped by a span of another thread (downloads of the Ingestion pool)
+#is marked shared and gets no memory peak
+open_spans = []
+open_lock = threading.Lock()
+
+
+class Metrics:
+    # calls, total / max seconds and memory peak of every (span, ticker), the
+    # peak being the largest of the calls run while no other thread was in a span
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}
+
+    def record(self, name, ticker, seconds, peak):
+        with self.lock:
+            s = self.spans.setdefault((name, ticker), {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'peak_bytes': 0})
+            s['calls'] += 1
+            s['seconds'] += seconds
+            s['max_seconds'] = max(s['max_seconds'], seconds)
+            if peak is not None:
+                s['peak_bytes'] = max(s['peak_bytes'], peak)
+
+    def reset(self):
+        with self.lock:
+            self.spans = {}
+
+    def toJson(self):
+        with self.lock:
+            return [dict(span=name, ticker=ticker, **values) for (name, ticker), values in sorted(
+                self.spans.items(), key=lambda item: (item[0][0], item[0][1] or ''))]
+
+    def toPrometheus(self):
+        lines = []
+        series = (('calls', 'pipeline_span_calls_total', 'counter', 'Number of calls'),
+                  ('seconds', 'pipeline_span_seconds_total', 'counter', 'Time spent in the span'),
+                  ('max_seconds', 'pipeline_span_max_seconds', 'gauge', 'Longest call of the span'),
+                  ('peak_bytes', 'pipeline_span_peak_bytes', 'gauge', 'Peak of traced memory in the calls not overlapped by another thread'))
+        spans = self.toJson()
+        for key, metric, kind, help_text in series:
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for s in spans:
+                labels = f'span="{s["span"]}",ticker="{s["ticker"] or ""}"'
+                lines.append(f'{metric}{{{labels}}} {s[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def enable(memory=False):
+    global ENABLED, MEMORY
+    ENABLED = True
+    MEMORY = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+@contextmanager
+def tickerContext(ticker):
+    # spans opened inside are attributed to this ticker
+    previous = getattr(local, 'ticker', None)
+    local.ticker = ticker
+    try:
+        yield
+    finally:
+        local.ticker = previous
+
+
+@contextmanager
+def span(name, ticker=None):
+    if not ENABLED:
+        yield
+        return
+    ticker = ticker if ticker is not None else getattr(local, 'ticker', None)
+    memory = MEMORY and tracemalloc.is_tracing()
+    if memory:
+        entry = {'thread': threading.get_ident(), 'shared': False}
+        with open_lock:
+            if any(other['thread'] != entry['thread'] for other in open_spans):
+                entry['shared'] = True
+                for other in open_spans:
+                    other['shared'] = True
+            open_spans.append(entry)
+            #peaks of nested spans are handed over to the enclosing one
+            stack = local.__dict__.setdefault('stack', [])
+            if stack:
+                stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+            if not entry['shared'] and hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            stack.append([current, current])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        peak = 0
+        if memory:
+            with open_lock:
+                open_spans[:] = [other for other in open_spans if other is not entry]
+                base, nested_peak = stack.pop()
+                absolute = max(tracemalloc.get_traced_memory()[1], nested_peak)
+                peak = None if entry['shared'] else absolute - base
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], absolute)
+        metrics.record(name, ticker, seconds, peak)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'span': name, 'ticker': ticker, 'seconds': seconds, 'peak_bytes': peak}))
+
+
+def instrumented(fn):
+    # times every call of fn in a span named after it, attributed to its
+    # ticker argument when it has one
+    name = fn.__qualname__
+    params = list(inspect.signature(fn).parameters)
+    position = next((i for i, p in enumerate(params) if p in TICKER_ARGS), None)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return fn(*args, **kwargs)
+        ticker = None
+        if position is not None:
+            ticker = args[position] if position < len(args) else kwargs.get(params[position])
+            ticker = ticker if isinstance(ticker, str) else None
+        with span(name, ticker):
+            return fn(*args, **kwargs)
+
+    return wrapper
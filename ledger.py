@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+from signals import encodeSignals, BUY, SELL
+
+#crypto trades every day of the year
+PERIODS_PER_YEAR = 365
+
+
+def holdings(codes):
+    # 1 on the bars where a position is open after the bar, 0 otherwise
+    codes = np.asarray(codes)
+    rows = np.where(codes != 0, np.arange(len(codes)), -1)
+    rows = np.maximum.accumulate(rows) if len(rows) else rows
+    held = (codes[np.maximum(rows, 0)] == BUY).astype(np.int8)
+    held[rows < 0] = 0
+    return held
+
+
+def barFactors(codes, high, low, close):
+    # growth of a portfolio fully invested at each buy over every bar: bought
+    # at the Low, marked at the Close while held, sold at the High
+    codes = np.asarray(codes)
+    high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+    held = holdings(codes)
+    prev_held = np.r_[0, held[:-1]]
+    prev_close = np.r_[np.nan, close[:-1]]
+    factors = np.ones(len(codes))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factors = np.where((held == 1) & (prev_held == 0), close / low, factors)
+        factors = np.where((held == 1) & (prev_held == 1), close / prev_close, factors)
+        factors = np.where((held == 0) & (prev_held == 1), high / prev_close, factors)
+    return factors
+
+
+def portfolioValue(codes, high, low, close):
+    # value of that portfolio from 1 on the bar before the first buy, empty
+    # when the strategy never buys
+    codes = np.asarray(codes)
+    buys = np.flatnonzero(codes == BUY)
+    if not len(buys):
+        return np.empty(0)
+    return np.r_[1.0, np.cumprod(barFactors(codes, high, low, close)[buys[0]:])]
+
+
+class EquityState:
+    # Return, annualised volatility and Sharpe ratio (no risk-free rate) of
+    # the bar returns and maximum drawdown of portfolioValue for one strategy
+    # (a compounded portfolio, where get_returns totals one unit per trade).
+    # Keeps the open position, the last close and portfolio value, the running
+    # moments of the bar returns (Welford) and the drawdown, so the metrics of
+    # a new bar are updated in O(1). Like IndicatorState, the bars already
+    # seen keep the signals they had when they were added.
+
+    def __init__(self, periods=PERIODS_PER_YEAR):
+
+        self.periods = periods
+        self.count = 0
+        self.last = None
+        self.trades = 0
+        self.held = 0
+        self.close = None
+        self.value = None
+        self.peak = None
+        self.max_drawdown = np.nan
+        #count / mean / sum of squared deviations of the bar returns
+        self.moments = [0, 0.0, 0.0]
+
+    @classmethod
+    def fromFrame(cls, df, strategy, periods=PERIODS_PER_YEAR):
+        # state after the bars of df, built with array operations
+        state = cls(periods)
+        codes = encodeSignals(df[strategy].values)
+        n = len(codes)
+        state.count = n
+        if not n:
+            return state
+        state.last = str(pd.Timestamp(df['Date'].iloc[-1]))
+        state.trades = int(np.count_nonzero(codes))
+        state.held = int(holdings(codes)[-1])
+        state.close = float(df['Close'].iloc[-1])
+
+        value = portfolioValue(codes, df['High'].values, df['Low'].values, df['Close'].values)
+        if len(value):
+            state.value = float(value[-1])
+            state.peak = float(value.max())
+            state.max_drawdown = float((value / np.maximum.accumulate(value) - 1).min())
+            returns = value[1:] / value[:-1] - 1
+            mean = returns.mean()
+            state.moments = [len(returns), float(mean), float(((returns - mean) ** 2).sum())]
+        return state
+
+    def update(self, date, high, low, close, code):
+        # add one bar with its signal code
+        self.count += 1
+        self.last = str(pd.Timestamp(date))
+        held = 1 if code == BUY else 0 if code == SELL else self.held
+        if code != 0:
+            self.trades += 1
+        if held and not self.held:
+            factor = close / low
+            if self.value is None:
+                self.value = self.peak = 1.0
+                self.max_drawdown = 0.0
+        elif held:
+            factor = close / self.close
+        elif self.held:
+            factor = high / self.close
+        else:
+            factor = 1.0
+        self.held = held
+        self.close = float(close)
+        if self.value is None:
+            return
+
+        ret = float(factor) - 1
+        count, mean, m2 = self.moments
+        count += 1
+        delta = ret - mean
+        mean += delta / count
+        m2 += delta * (ret - mean)
+        self.moments = [count, mean, m2]
+        self.value *= float(factor)
+        self.peak = max(self.peak, self.value)
+        self.max_drawdown = min(self.max_drawdown, self.value / self.peak - 1)
+
+    def metrics(self):
+        count, mean, m2 = self.moments
+        if not count:
+            return {'return': np.nan, 'volatility': np.nan, 'sharpe': np.nan,
+                    'max_drawdown': np.nan, 'trades': self.trades}
+        std = math.sqrt(m2 / count)
+        return {
+            'return': self.value - 1,
+            'volatility': std * math.sqrt(self.periods),
+            'sharpe': mean / std * math.sqrt(self.periods) if std > 0 else np.nan,
+            'max_drawdown': self.max_drawdown,
+            'trades': self.trades,
+        }
+
+    def toDict(self):
+        return {
+            'periods': self.periods,
+            'count': self.count,
+            'last': self.last,
+            'trades': self.trades,
+            'held': self.held,
+            'close': self.close,
+            'value': self.value,
+            'peak': self.peak,
+            'max_drawdown': None if np.isnan(self.max_drawdown) else self.max_drawdown,
+            'moments': self.moments,
+        }
+
+    @classmethod
+    def fromDict(cls, d):
+        state = cls(d['periods'])
+        for key in ('count', 'last', 'trades', 'held', 'close', 'value', 'peak', 'moments'):
+            setattr(state, key, d[key])
+        state.max_drawdown = np.nan if d['max_drawdown'] is None else d['max_drawdown']
+        return state
+
+
+def saveStates(states, path):
+    # the states of the strategies of one ticker, by signal column
+    with open(path, 'w') as f:
+        json.dump({strategy: state.toDict() for strategy, state in states.items()}, f)
+
+
+def loadStates(path):
+    with open(path) as f:
+        return {strategy: EquityState.fromDict(d) for strategy, d in json.load(f).items()}
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+
+from code2 import OVERLAY_TRACES, STRATEGY_NAMES
+from indicators import IndicatorState
+from signals import encodeSignals, lastState
+
+logger = logging.getLogger(__name__)
+
+#bars kept by a live ticker and shown on the live chart
+LIVE_POINTS = 500
+
+#lines of the live chart, then a buy and a sell marker trace per strategy
+LIVE_LINES = dict(Close="Close", **OVERLAY_TRACES)
+MARKERS = {'buy': ('Low', 'triangle-up', 'rgb(0, 255, 0)'), 'sell': ('High', 'triangle-down', 'rgb(255, 0, 0)')}
+
+
+class BarSimulator:
+    # Random walk bars continuing a history, stands in for a live bar feed.
+
+    def __init__(self, history, step=None, volatility=0.03, seed=None):
+
+        dates = history['Date']
+        self.date = pd.Timestamp(dates.iloc[-1])
+        self.step = pd.Timedelta(step) if step is not None else dates.iloc[-1] - dates.iloc[-2]
+        self.close = float(history['Close'].iloc[-1])
+        self.volatility = volatility
+        self.rng = np.random.RandomState(seed)
+
+    def next(self):
+        open_ = self.close
+        self.close = open_ * math.exp(self.rng.normal(0, self.volatility))
+        spread = abs(self.rng.normal(0, self.volatility / 2)) * self.close
+        self.date += self.step
+        return {
+            'Date': self.date,
+            'High': max(open_, self.close) + spread,
+            'Low': min(open_, self.close) - spread,
+            'Open': open_,
+            'Close': self.close,
+            'Volume': float(self.rng.randint(1e3, 1e6)),
+        }
+
+
+class LiveTicker:
+    # Indicators and signals of one ticker, updated bar by bar.
+    # The indicators come from an IndicatorState and the signals from
+    # Data.computeStrategies on the new bar alone with the positions carried
+    # over, so a bar costs the same whatever the length of the history. Only
+    # the last LIVE_POINTS bars are kept, each with the time it arrived.
+
+    def __init__(self, data, history, keep=LIVE_POINTS):
+
+        self.data = data
+        self.state = IndicatorState.fromFrame(history, data.rsi_period)
+        self.positions = {col: lastState(encodeSignals(history[col].values))
+                          for col in history.columns if 'signal' in col}
+        self.seq = 0
+        #(sequence number, arrival time, row) of the last bars
+        self.rows = deque([(0, None, row) for row in history.tail(keep).to_dict('records')], maxlen=keep)
+        self.lock = threading.Lock()
+
+    def push(self, bar):
+        arrival = time.perf_counter()
+        row = dict(bar, **self.state.update(bar['Date'], bar['Close']))
+        df = self.data.computeStrategies(pd.DataFrame([row]), self.positions)
+        row = df.iloc[0].to_dict()
+        with self.lock:
+            self.positions = {col: lastState(encodeSignals(df[col].values), self.positions.get(col, 0))
+                              for col in self.positions}
+            self.seq += 1
+            self.rows.append((self.seq, arrival, row))
+        return row
+
+    def since(self, seq):
+        # bars pushed after seq with their arrival times, and the last seq
+        with self.lock:
+            new = [(arrival, row) for s, arrival, row in self.rows if s > seq]
+            return new, self.seq
+
+    def snapshot(self):
+        with self.lock:
+            return [row for _, _, row in self.rows], self.seq
+
+
+def traceData(rows):
+    # x / y of every trace of the live chart for a list of rows, in the order
+    # of liveFigure
+    dates = [row['Date'] for row in rows]
+    xs, ys = [], []
+    for col in LIVE_LINES:
+        xs.append(dates)
+        ys.append([row[col] for row in rows])
+    for col in STRATEGY_NAMES:
+        for side, (price, _, _) in MARKERS.items():
+            picked = [row for row in rows if row.get(col) == side]
+            xs.append([row['Date'] for row in picked])
+            ys.append([row[price] for row in picked])
+    return xs, ys
+
+
+def liveFigure(rows, ticker):
+    xs, ys = traceData(rows)
+    names = list(LIVE_LINES.values()) + [f'{STRATEGY_NAMES[col]} {side}' for col in STRATEGY_NAMES
+                                         for side in MARKERS]
+    styles = [dict(mode='lines')] * len(LIVE_LINES) + [
+        dict(mode='markers', marker=dict(symbol=symbol, color=color, size=9))
+        for col in STRATEGY_NAMES for side, (_, symbol, color) in MARKERS.items()]
+    fig = go.Figure([go.Scatter(x=x, y=y, name=name, **style) for x, y, name, style in zip(xs, ys, names, styles)])
+    fig.update_layout(template="plotly_dark", title=f'{ticker} (live)', uirevision=ticker)
+    return fig
+
+
+def extendUpdate(rows):
+    # extendData of the live chart for new rows : every trace gets its new
+    # points and the chart keeps the last LIVE_POINTS
+    xs, ys = traceData(rows)
+    return [dict(x=xs, y=ys), list(range(len(xs))), LIVE_POINTS]
+
+
+class LiveFeed:
+    # Pushes a simulated bar to every watched ticker every interval seconds.
+    # The new bars also update the screener index when one is given.
+
+    def __init__(self, data, interval=1.0, seed=None, screener=None):
+
+        self.data = data
+        self.interval = interval
+        self.seed = seed
+        self.screener = screener
+        self.tickers = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def watch(self, ticker, history):
+        with self.lock:
+            if ticker not in self.tickers:
+                self.tickers[ticker] = (LiveTicker(self.data, history), BarSimulator(history, seed=self.seed))
+            return self.tickers[ticker][0]
+
+    def tick(self):
+        with self.lock:
+            watched = list(self.tickers.items())
+        for ticker, (live, simulator) in watched:
+            row = live.push(simulator.next())
+            if self.screener is not None:
+                self.screener.update(ticker, row)
+
+    def loop(self):
+        while True:
+            start = time.perf_counter()
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("live update failed")
+            time.sleep(max(self.interval - (time.perf_counter() - start), 0))
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.loop, daemon=True)
+            self.thread.start()
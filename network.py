@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+#seconds a response without freshness headers is served from the cache
+TTL = 3600
+#entries not stored or revalidated for MAX_AGE seconds are removed, then the
+#oldest ones until the cache is under MAX_SIZE bytes
+MAX_AGE = 7 * 24 * 3600
+MAX_SIZE = 512 * 2 ** 20
+
+
+def makeSession(pool_size=8):
+    # one keep-alive session shared by every download thread
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class RateLimiter:
+    # At most `rate` requests per second to each host, shared by all threads
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.next_time = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.rate or host is None:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time.get(host, now))
+            self.next_time[host] = slot + 1.0 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CacheMiss(requests.RequestException):
+    # raised in cache-only mode for a request that was never cached
+    pass
+
+
+class Call:
+    # a request in flight, waited on by the identical requests made meanwhile
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class CachedSession:
+    # Network layer used for every download (symbols, bars).
+    # GET requests go through one pooled keep-alive session and their 200
+    # responses are kept on disk (<cache_dir>/<key>.json and .body). A cached
+    # response is served without a request while fresh (Cache-Control
+    # max-age, Expires, or ttl seconds when the server gives neither); after
+    # that it is revalidated with its ETag / Last-Modified. Identical requests
+    # made while one is in flight wait for it instead of going out again.
+    # With cache_only=True nothing goes to the network: every request is
+    # answered from the cache whatever its age, and CacheMiss is raised for
+    # the others, for reproducible reruns. Otherwise the stale entries are
+    # pruned when the session is created (the bar URLs change every day).
+    # Other attributes (cookies, mount, ...) are those of the requests session,
+    # so it can be handed to pandas_datareader as its session.
+
+    def __init__(self, cache_dir, pool_size=8, ttl=TTL, cache_only=False, max_age=MAX_AGE, max_size=MAX_SIZE):
+
+        self.cache_dir = cache_dir
+        self.session = makeSession(pool_size)
+        self.ttl = ttl
+        self.cache_only = cache_only
+        self.inflight = {}
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        if not cache_only:
+            self.prune(max_age, max_size)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    @staticmethod
+    def key(url, params=None):
+        if params:
+            url += ('&' if '?' in url else '?') + urlencode(sorted(dict(params).items()))
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        # (meta, body) of a cached response, None when not cached
+        try:
+            with open(self.path(key) + '.json') as f:
+                meta = json.load(f)
+            with open(self.path(key) + '.body', 'rb') as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key, resp):
+        meta = {'url': resp.url, 'headers': dict(resp.headers), 'stored': time.time()}
+        for ext, content in (('.body', resp.content), ('.json', json.dumps(meta).encode())):
+            tmp = self.path(key) + ext + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, self.path(key) + ext)
+
+    def touch(self, key, meta):
+        # a revalidated response is fresh again
+        meta['stored'] = time.time()
+        tmp = self.path(key) + '.json.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.path(key) + '.json')
+
+    def prune(self, max_age=MAX_AGE, max_size=MAX_SIZE):
+        # removes the entries older than max_age seconds (by the time they were
+        # stored or revalidated), then the oldest until max_size bytes are left
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            key, ext = name.split('.', 1)
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            #touch rewrites the .json file of a revalidated entry
+            mtime, size = entries.get(key, (0, 0))
+            entries[key] = (max(mtime, stat.st_mtime), size + stat.st_size)
+
+        now = time.time()
+        total = sum(size for _, size in entries.values())
+        removed = 0
+        for key, (mtime, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if now - mtime < max_age and total <= max_size:
+                break
+            for ext in ('.json', '.body', '.json.tmp', '.body.tmp'):
+                try:
+                    os.remove(self.path(key) + ext)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        if removed:
+            logger.info('%d stale responses removed from the cache', removed)
+        return removed
+
+    def lifetime(self, headers):
+        # seconds a response stays fresh, 0 when it must not be reused as is
+        headers = CaseInsensitiveDict(headers)
+        control = headers.get('Cache-Control', '').lower()
+        if 'no-store' in control or 'no-cache' in control:
+            return 0
+        age = re.search(r'max-age=(\d+)', control)
+        if age:
+            return int(age.group(1))
+        if headers.get('Expires') and headers.get('Date'):
+            try:
+                expires = email.utils.parsedate_to_datetime(headers['Expires'])
+                date = email.utils.parsedate_to_datetime(headers['Date'])
+                return max((expires - date).total_seconds(), 0)
+            except (TypeError, ValueError):
+                return 0
+        return self.ttl
+
+    @staticmethod
+    def response(meta, body):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = meta['url']
+        resp.headers = CaseInsensitiveDict(meta['headers'])
+        resp._content = body
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        return resp
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        key = self.key(url, params)
+        with self.lock:
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = self.fetch(key, url, params, headers, **kwargs)
+            return call.response
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            call.event.set()
+
+    def fetch(self, key, url, params, headers, **kwargs):
+        cached = self.load(key)
+        if self.cache_only:
+            if cached is None:
+                raise CacheMiss(f'{url} is not in the cache')
+            return self.response(*cached)
+        if cached is not None:
+            meta, body = cached
+            if time.time() - meta['stored'] < self.lifetime(meta['headers']):
+                return self.response(meta, body)
+
+        headers = dict(headers or {})
+        if cached is not None:
+            validators = CaseInsensitiveDict(meta['headers'])
+            if validators.get('ETag'):
+                headers.setdefault('If-None-Match', validators['ETag'])
+            if validators.get('Last-Modified'):
+                headers.setdefault('If-Modified-Since', validators['Last-Modified'])
+        resp = self.session.get(url, params=params, headers=headers, **kwargs)
+        if resp.status_code == 304 and cached is not None:
+            self.touch(key, meta)
+            return self.response(meta, body)
+        if resp.status_code == 200 and 'no-store' not in resp.headers.get('Cache-Control', '').lower():
+            self.save(key, resp)
+        return resp
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_COLUMNS
+from providers import BAR_COLUMNS
+from signals import signalState, decodeSignals
+
+
+class Panel:
+    # Whole-universe version of computeIndicators / computeStrategies.
+    # Every field is a bars x tickers float frame where row k is the k-th bar
+    # of each ticker (NaN after the last bar of the shorter histories), so
+    # each indicator is one vectorized pass over all tickers at once and its
+    # windows run over each ticker's own bars: a date that one ticker has
+    # and another has not changes nothing, the values are those of a per
+    # ticker run.
+    # Memory is about 8 bytes x bars of the longest history x tickers per
+    # field (17 fields). Against the per-ticker path, which computes through
+    # the indicator registry, the gain is about 1.3x (benchUniverse, 50
+    # tickers x 3000 bars, staggered listings); most of the time left goes
+    # to frames(), building the per-ticker frames back.
+
+    def __init__(self, frames):
+
+        self.tickers = list(frames)
+        self.dates = [df['Date'].values.astype('datetime64[ns]') for df in frames.values()]
+        self.lengths = [len(d) for d in self.dates]
+        n = max(self.lengths, default=0)
+        self.fields = {}
+        for col in BAR_COLUMNS[1:]:
+            values = np.full((n, len(self.tickers)), np.nan)
+            for j, df in enumerate(frames.values()):
+                values[:self.lengths[j], j] = df[col].values
+            self.fields[col] = pd.DataFrame(values, columns=self.tickers)
+
+    def computeIndicators(self, rsi_period=14, columns=INDICATOR_COLUMNS):
+        # the moving averages, bands and RSI are always computed (the
+        # strategies read them), the returns only when in columns
+
+        close = self.fields['Close']
+        f = self.fields
+
+        #get moving average
+        f['20_sma'] = close.rolling(20).mean()
+        f['50_sma'] = close.rolling(50).mean()
+        f['200_sma'] = close.rolling(200).mean()
+
+        #get bollinger bands, one population std per ticker
+        width = 0.5 * f['200_sma'].std(ddof=0)
+        f['low_boll'] = f['50_sma'] - width
+        f['high_boll'] = f['50_sma'] + width
+
+        #get returns
+        for col, lag in (('daily_returns', 1), ('monthly_returns', 31), ('annual_returns', 365)):
+            if col in columns:
+                f[col] = close / close.shift(lag) - 1
+
+        #Compute RSI
+        delta = close.diff().diff()
+        roll_up = delta.clip(lower=0).rolling(rsi_period).mean()
+        roll_down = (-delta).clip(lower=0).rolling(rsi_period).mean()
+        f['rsi'] = 100.0 - (100.0 / (1.0 + roll_up / roll_down))
+
+    def computeStrategies(self):
+
+        f = self.fields
+        conditions = {
+            'signal_bo': (f['low_boll'].values > f['Close'].values, f['high_boll'].values < f['Close'].values),
+            'signal_ma': (f['20_sma'].values > f['50_sma'].values, f['20_sma'].values < f['50_sma'].values),
+            'signal_rsi': (f['rsi'].values < 40, f['rsi'].values > 60),
+        }
+        #one run of the engine per strategy over all the tickers
+        for col, (entry, exit) in conditions.items():
+            f[col] = pd.DataFrame(signalState(entry, exit), columns=self.tickers)
+
+    def frames(self):
+        # back to the per-ticker frames produced by computeIndicators/computeStrategies
+        out = {}
+        for j, ticker in enumerate(self.tickers):
+            n = self.lengths[j]
+            data = {'Date': self.dates[j]}
+            for col, values in self.fields.items():
+                column = values.values[:n, j]
+                data[col] = decodeSignals(column) if 'signal' in col else column
+            out[ticker] = pd.DataFrame(data)
+        return out
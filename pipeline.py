@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from instrument import tickerContext
+from network import CacheMiss, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+#requests per second sent to each host, None to send them as fast as the workers go
+RATE = 4
+
+
+class Ingestion:
+    # Concurrent multi-ticker ingestion stage.
+    # Downloads run in a thread pool while the calling thread computes the
+    # indicators and strategies of the tickers already downloaded, so the CPU
+    # work overlaps the network round trips. A ticker that still fails after
+    # the retries is reported in `errors` and does not stop the others.
+    # The downloads from one host are spaced to at most `rate` per second.
+    # With batch=True the tickers are downloaded first and then processed
+    # together as one panel by Data.computeUniverse.
+
+    def __init__(self, data, workers=8, rate=RATE, retries=3, backoff=0.5, incremental=True, batch=False):
+
+        self.data = data
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.incremental = incremental
+        self.batch = batch
+
+    def fetch(self, ticker):
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(self.data.provider.host)
+            try:
+                df = self.data.getData(ticker, incremental=self.incremental)
+                if df.empty:
+                    raise ValueError(f'no bars returned for {ticker}')
+                return df
+            except CacheMiss:
+                raise
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                logger.warning('download of %s failed, retrying in %.1f s', ticker, delay)
+                time.sleep(delay)
+
+    def process(self, df, ticker):
+        with tickerContext(ticker):
+            #a stored ticker only gets its new bars computed, in O(1) per bar
+            if self.incremental:
+                extended = self.data.extendFrame(ticker, df)
+                if extended is not None:
+                    return extended
+            df = self.data.computeIndicators(df, key=ticker)
+            df = self.data.computeStrategies(df)
+            self.data.exportData(df, ticker)
+        return df
+
+    def run(self, tickers):
+
+        frames = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.fetch, ticker): ticker for ticker in tickers}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    df = future.result()
+                    frames[ticker] = df if self.batch else self.process(df, ticker)
+                except Exception as e:
+                    logger.error('skipping %s: %r', ticker, e)
+                    errors[ticker] = e
+
+        if self.batch and frames:
+            frames = self.data.computeUniverse(frames)
+            for ticker, df in frames.items():
+                self.data.exportData(df, ticker)
+
+        #keep the order of the tickers list
+        frames = {ticker: frames[ticker] for ticker in tickers if ticker in frames}
+        return frames, errors
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from pandas_datareader import data as pdr
+
+#columns returned by every provider, in the order of the Yahoo frames
+BAR_COLUMNS = ['Date', 'High', 'Low', 'Open', 'Close', 'Volume']
+
+
+class Provider:
+    # Source of daily OHLCV bars used by Data.getData.
+    # getBars returns a frame with BAR_COLUMNS for the bars dated in [start, end].
+    # host is the server the provider talks to (None when it stays local), it is
+    # the key used by the ingestion pipeline to rate limit requests.
+
+    host = None
+
+    def getBars(self, ticker, start, end):
+        raise NotImplementedError
+
+
+class YahooProvider(Provider):
+
+    host = 'query1.finance.yahoo.com'
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def getBars(self, ticker, start, end):
+        return pdr.get_data_yahoo(ticker, start, end, session=self.session).reset_index().drop(columns= {'Adj Close'})
+
+
+class FileProvider(Provider):
+    # Offline stand-in: reads <path>/<ticker>.csv files with the BAR_COLUMNS
+
+    def __init__(self, path):
+        self.path = path
+
+    def getBars(self, ticker, start, end):
+        df = pd.read_csv(os.path.join(self.path, ticker + '.csv'), parse_dates=['Date'])
+        df = df.loc[(df['Date'] >= pd.Timestamp(start)) & (df['Date'] <= pd.Timestamp(end)), BAR_COLUMNS]
+        return df.reset_index(drop=True)
+
+
+class HttpProvider(Provider):
+    # Local stand-in server: GET <base_url>/<ticker>.csv returns the BAR_COLUMNS
+
+    def __init__(self, base_url, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.host = urlparse(base_url).netloc
+        self.session = session if session is not None else requests.Session()
+
+    def getBars(self, ticker, start, end):
+        resp = self.session.get(f'{self.base_url}/{ticker}.csv')
+        resp.raise_for_status()
+        df = pd.read_csv(io.StringIO(resp.text), parse_dates=['Date'])
+        df = df.loc[(df['Date'] >= pd.Timestamp(start)) & (df['Date'] <= pd.Timestamp(end)), BAR_COLUMNS]
+        return df.reset_index(drop=True)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from indicators import INDICATOR_COLUMNS
+
+#parameters of computeIndicators
+DEFAULT_PARAMS = {'rsi_period': 14, 'band_width': 0.5}
+
+#columns each strategy and the price chart read
+STRATEGY_INPUTS = {
+    'signal_bo': ['low_boll', 'high_boll'],
+    'signal_ma': ['20_sma', '50_sma'],
+    'signal_rsi': ['rsi'],
+}
+CHART_INPUTS = ['20_sma', '50_sma', '200_sma', 'low_boll', 'high_boll']
+
+
+class Indicator:
+    # one node of the graph : fn(params, close, *inputs) -> array or scalar
+
+    def __init__(self, name, inputs, fn):
+        self.name = name
+        self.inputs = inputs
+        self.fn = fn
+
+
+REGISTRY = {}
+
+
+def register(name, inputs=()):
+    def decorator(fn):
+        REGISTRY[name] = Indicator(name, tuple(inputs), fn)
+        return fn
+    return decorator
+
+
+#shared primitives
+
+@register('valid')
+def valid(params, close):
+    return ~np.isnan(close)
+
+
+@register('close_cumsum', ['valid'])
+def closeCumsum(params, close, valid):
+    return np.r_[0.0, np.cumsum(np.where(valid, close, 0.0))]
+
+
+@register('valid_cumsum', ['valid'])
+def validCumsum(params, close, valid):
+    return np.r_[0, np.cumsum(valid)]
+
+
+@register('diff2')
+def diff2(params, close):
+    # (rows, values) of the second difference the RSI of computeIndicators is
+    # built on; like diff().dropna() twice, a missing close drops the
+    # differences around it and the next one spans the gap
+    d1 = np.diff(close)
+    rows = np.flatnonzero(~np.isnan(d1)) + 1
+    return rows[1:], np.diff(d1[rows - 1])
+
+
+@register('gain', ['diff2'])
+def gain(params, close, delta):
+    return np.where(delta[1] > 0, delta[1], 0.0)
+
+
+@register('loss', ['diff2'])
+def loss(params, close, delta):
+    return np.where(delta[1] < 0, -delta[1], 0.0)
+
+
+#columns
+
+def rollingMean(cs, counts, window, n):
+    # mean of every full window without missing value, NaN elsewhere
+    out = np.full(n, np.nan)
+    if n >= window:
+        full = counts[window:] - counts[:-window] == window
+        out[window - 1:] = np.where(full, (cs[window:] - cs[:-window]) / window, np.nan)
+    return out
+
+
+for window in (20, 50, 200):
+    register(f'{window}_sma', ['close_cumsum', 'valid_cumsum'])(
+        lambda params, close, cs, counts, window=window: rollingMean(cs, counts, window, len(close)))
+
+
+@register('band_std', ['200_sma'])
+def bandStd(params, close, sma):
+    # population std of the whole 200 SMA, as np.std of the column
+    return np.nanstd(sma) if np.any(~np.isnan(sma)) else np.nan
+
+
+@register('low_boll', ['50_sma', 'band_std'])
+def lowBoll(params, close, sma, std):
+    return sma - params['band_width'] * std
+
+
+@register('high_boll', ['50_sma', 'band_std'])
+def highBoll(params, close, sma, std):
+    return sma + params['band_width'] * std
+
+
+def pctChange(params, close, lag):
+    out = np.full(len(close), np.nan)
+    if len(close) > lag:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[lag:] = close[lag:] / close[:-lag] - 1
+    return out
+
+
+for column, lag in (('daily_returns', 1), ('monthly_returns', 31), ('annual_returns', 365)):
+    register(column)(lambda params, close, lag=lag: pctChange(params, close, lag))
+
+
+@register('rsi', ['diff2', 'gain', 'loss'])
+def rsi(params, close, delta, gains, losses):
+    # the window sums are added directly (period terms) rather than taken
+    # from cumulative sums, which lose precision on long histories
+    period = params['rsi_period']
+    out = np.full(len(close), np.nan)
+    if len(gains) >= period:
+        window = np.ones(period) / period
+        up = np.convolve(gains, window, 'valid')
+        down = np.convolve(losses, window, 'valid')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[delta[0][period - 1:]] = 100.0 - (100.0 / (1.0 + up / down))
+    return out
+
+
+def requiredColumns(strategies=STRATEGY_INPUTS, chart=True):
+    # indicator columns read by the given signal columns and the price chart
+    columns = {col for strategy in strategies for col in STRATEGY_INPUTS[strategy]}
+    if chart:
+        columns.update(CHART_INPUTS)
+    return [col for col in INDICATOR_COLUMNS if col in columns]
+
+
+def barsVersion(df):
+    # version of the bars the indicators are computed from
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(df['Date'].values).view('uint8'))
+    h.update(np.ascontiguousarray(df['Close'].values, dtype=float).view('uint8'))
+    return h.hexdigest()
+
+
+class IndicatorEngine:
+    # Executor of the registry.
+    # The nodes needed by the requested columns are resolved through their
+    # inputs and each one is computed once, the primitives (cumulative sums,
+    # second difference, gains / losses) being shared by the columns built
+    # on them. With a key, every node computed is memoized under (key, bars
+    # version, params) so another request on the same bars only computes
+    # what is missing.
+
+    def __init__(self, registry=REGISTRY, cache_size=64):
+
+        self.registry = registry
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def order(self, columns):
+        # nodes to evaluate, every node after its inputs
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self.registry[name].inputs:
+                visit(dep)
+            order.append(name)
+
+        for column in columns:
+            visit(column)
+        return order
+
+    def compute(self, df, columns=INDICATOR_COLUMNS, params=None, key=None):
+        # {column: values} of the requested columns of df
+        params = dict(DEFAULT_PARAMS, **(params or {}))
+        values = {}
+        if key is not None:
+            memo = (key, barsVersion(df), tuple(sorted(params.items())))
+            with self.lock:
+                values = self.cache.setdefault(memo, {})
+                self.cache.move_to_end(memo)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        close = np.asarray(df['Close'].values, dtype=float)
+        for name in self.order(columns):
+            if name not in values:
+                node = self.registry[name]
+                values[name] = node.fn(params, close, *(values[dep] for dep in node.inputs))
+        return {column: values[column] for column in columns}
+
+
+#engine shared by the Data instances of the process
+ENGINE = IndicatorEngine()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import operator
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from signals import encodeSignals, lastState
+
+#file of the index in the data directory
+SCREENER_FILE = 'screener.json'
+
+#latest values kept per ticker, the 20 / 50 SMAs of the bar before too for
+#the crossings
+VALUE_COLUMNS = ['Close', '20_sma', '50_sma', '200_sma', 'low_boll', 'high_boll', 'rsi']
+PREVIOUS_COLUMNS = {'prev_20_sma': '20_sma', 'prev_50_sma': '50_sma'}
+#open (1) / closed (0) position of each strategy
+POSITION_COLUMNS = ['signal_bo', 'signal_ma', 'signal_rsi']
+
+#columns computed when queried
+DERIVED_COLUMNS = {
+    'ma_cross_up': lambda c: (c['prev_20_sma'] <= c['prev_50_sma']) & (c['20_sma'] > c['50_sma']),
+    'ma_cross_down': lambda c: (c['prev_20_sma'] >= c['prev_50_sma']) & (c['20_sma'] < c['50_sma']),
+    'below_low_boll': lambda c: c['Close'] < c['low_boll'],
+    'above_high_boll': lambda c: c['Close'] > c['high_boll'],
+}
+
+OPERATORS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    '=': operator.eq, '==': operator.eq, '!=': operator.ne,
+    'lt': operator.lt, 'le': operator.le, 'gt': operator.gt, 'ge': operator.ge,
+    'eq': operator.eq, 'ne': operator.ne,
+}
+
+#ready made screens : filters of ScreenerIndex.query
+SCREENS = {
+    "RSI below 40": [('rsi', '<', 40)],
+    "20 SMA crossed above 50 SMA": [('ma_cross_up', '==', 1)],
+    "20 SMA crossed below 50 SMA": [('ma_cross_down', '==', 1)],
+    "Below lower bollinger band": [('below_low_boll', '==', 1)],
+    "Above upper bollinger band": [('above_high_boll', '==', 1)],
+}
+
+#one condition of a DataTable filter_query : {column} op value
+FILTER_TERM = re.compile(r'\{([^}]+)\}\s*s?(<=|>=|!=|==|=|<|>|lt|le|gt|ge|eq|ne)\s*"?([^"]*?)"?\s*$')
+
+
+def parseFilterQuery(query):
+    # filters of a DataTable filter_query ("{rsi} < 40 && {signal_ma} = 1"),
+    # terms that cannot be read are ignored
+    filters = []
+    for term in (query or '').split('&&'):
+        match = FILTER_TERM.match(term.strip())
+        if match:
+            column, op, value = match.groups()
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+            filters.append((column, op, value))
+    return filters
+
+
+def filterQuery(filters):
+    # DataTable filter_query of a list of filters
+    return ' && '.join(f'{{{column}}} {op} {value:g}' if isinstance(value, (int, float)) else
+                       f'{{{column}}} {op} "{value}"' for column, op, value in filters)
+
+
+class ScreenerIndex:
+    # Latest state of every ticker of the universe for screening.
+    # One row per ticker in column arrays : date and values of the last bar,
+    # 20 / 50 SMAs of the bar before and the open / closed position of each
+    # strategy. A ticker is updated with its new bars only (the positions are
+    # carried over with lastState), and a query is a mask over the arrays so
+    # it stays in the milliseconds for thousands of tickers.
+
+    def __init__(self, capacity=64):
+
+        self.tickers = []
+        self.rows = {}
+        self.dates = np.full(capacity, np.datetime64('NaT'), dtype='datetime64[ns]')
+        self.values = {col: np.full(capacity, np.nan) for col in VALUE_COLUMNS + list(PREVIOUS_COLUMNS)}
+        self.positions = {col: np.zeros(capacity, dtype=np.int8) for col in POSITION_COLUMNS}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    def row(self, ticker):
+        # row of a ticker, added at the end (arrays grown by doubling) when new
+        if ticker in self.rows:
+            return self.rows[ticker]
+        i = len(self.tickers)
+        if i == len(self.dates):
+            self.dates = np.r_[self.dates, np.full(i, np.datetime64('NaT'), dtype='datetime64[ns]')]
+            self.values = {col: np.r_[a, np.full(i, np.nan)] for col, a in self.values.items()}
+            self.positions = {col: np.r_[a, np.zeros(i, dtype=np.int8)] for col, a in self.positions.items()}
+        self.tickers.append(ticker)
+        self.rows[ticker] = i
+        return i
+
+    def lastDate(self, ticker):
+        with self.lock:
+            return pd.Timestamp(self.dates[self.rows[ticker]]) if ticker in self.rows else None
+
+    def update(self, ticker, bar):
+        # one new bar (dict with Date, the indicator and signal columns)
+        with self.lock:
+            i = self.row(ticker)
+            for prev, col in PREVIOUS_COLUMNS.items():
+                self.values[prev][i] = self.values[col][i]
+            self.dates[i] = np.datetime64(pd.Timestamp(bar['Date']), 'ns')
+            for col in VALUE_COLUMNS:
+                self.values[col][i] = bar.get(col, np.nan)
+            for col in POSITION_COLUMNS:
+                if col in bar:
+                    self.positions[col][i] = lastState(encodeSignals([bar[col]]), self.positions[col][i])
+
+    def updateFrame(self, ticker, df):
+        # bars of a frame newer than the last one of the ticker, the whole
+        # history the first time
+        last = self.lastDate(ticker)
+        new = df if last is None or pd.isnull(last) else df.loc[df['Date'] > last]
+        if not len(new):
+            return
+        with self.lock:
+            i = self.row(ticker)
+            for prev, col in PREVIOUS_COLUMNS.items():
+                self.values[prev][i] = new[col].values[-2] if len(new) > 1 else self.values[col][i]
+            self.dates[i] = np.datetime64(pd.Timestamp(new['Date'].values[-1]), 'ns')
+            for col in VALUE_COLUMNS:
+                self.values[col][i] = new[col].values[-1] if col in new else np.nan
+            for col in POSITION_COLUMNS:
+                if col in new:
+                    self.positions[col][i] = lastState(encodeSignals(new[col].values), self.positions[col][i])
+
+    def columns(self):
+        # column arrays of the tickers, derived columns included
+        n = len(self.tickers)
+        columns = {col: a[:n] for col, a in self.values.items()}
+        columns.update({col: a[:n] for col, a in self.positions.items()})
+        with np.errstate(invalid='ignore'):
+            for col, fn in DERIVED_COLUMNS.items():
+                columns[col] = fn(columns).astype(np.int8)
+        return columns
+
+    def query(self, filters=(), sort=None, ascending=True, limit=None):
+        # DataFrame of the tickers matching every (column, op, value) filter,
+        # sorted on a column (NaN / NaT last) and cut to limit rows
+        with self.lock:
+            columns = dict(ticker=np.array(self.tickers, dtype=object), Date=self.dates[:len(self.tickers)].copy(),
+                           **self.columns())
+        mask = np.ones(len(columns['ticker']), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            for column, op, value in filters:
+                if column == 'Date':
+                    #a year alone is read as a number by parseFilterQuery
+                    value = np.datetime64(pd.Timestamp(str(int(value)) if isinstance(value, float) else value), 'ns')
+                mask &= np.asarray(OPERATORS[op](columns[column], value), dtype=bool)
+        rows = np.flatnonzero(mask)
+        if sort is not None:
+            keys = columns[sort][rows]
+            order = np.argsort(keys, kind='stable')
+            if not ascending:
+                order = order[::-1]
+                missing = pd.isnull(keys[order])
+                order = np.r_[order[~missing], order[missing]]
+            rows = rows[order]
+        if limit is not None:
+            rows = rows[:limit]
+        return pd.DataFrame({col: values[rows] for col, values in columns.items()})
+
+    def toDict(self):
+        with self.lock:
+            n = len(self.tickers)
+            return {
+                'tickers': self.tickers,
+                'dates': [None if pd.isnull(d) else str(pd.Timestamp(d)) for d in self.dates[:n]],
+                'values': {col: [None if v != v else float(v) for v in a[:n]] for col, a in self.values.items()},
+                'positions': {col: a[:n].tolist() for col, a in self.positions.items()},
+            }
+
+    @classmethod
+    def fromDict(cls, content):
+        index = cls(max(len(content['tickers']), 1))
+        for ticker in content['tickers']:
+            index.row(ticker)
+        n = len(index.tickers)
+        index.dates[:n] = pd.to_datetime(content['dates']).values
+        for col, values in content['values'].items():
+            if col in index.values:
+                index.values[col][:n] = np.array(values, dtype=float)
+        for col, values in content['positions'].items():
+            if col in index.positions:
+                index.positions[col][:n] = values
+        return index
+
+    def save(self, path):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.toDict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        # empty index when none has been saved yet
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls.fromDict(json.load(f))
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+
+from compact import CompactFrames
+from screener import SCREENER_FILE, ScreenerIndex
+from snapshot import Snapshot
+from store import Store
+
+logger = logging.getLogger(__name__)
+
+#directory of the shared cache in the data directory, versions kept in it
+#and seconds a version is kept after it was published whatever the workers read
+SHARED_DIR = 'shared'
+KEEP_VERSIONS = 2
+MIN_AGE = 3600
+
+
+class SharedVersion:
+    # One published version, attached read-only: frames memory mapped from its
+    # store when asked for, figures and browser data read as serialized json.
+
+    def __init__(self, path, version):
+
+        self.path = path
+        self.version = version
+        self.store = Store(path)
+        self.snapshot = Snapshot.load(self.store, lazy=True)
+        self.screener = ScreenerIndex.load(os.path.join(path, SCREENER_FILE))
+
+    def figurePath(self, ticker):
+        return os.path.join(self.path, 'figures', ticker + '.json')
+
+    def figure(self, ticker):
+        # figure of the whole history of a ticker, None when not published
+        path = self.figurePath(ticker)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def browser(self):
+        path = os.path.join(self.path, 'browser.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+
+class SharedCache:
+    # Results of the refreshes shared by the worker processes of a deployment.
+    # A refresh is published in a new directory <root>/<version> (frames in a
+    # Store, snapshot.json, screener.json, the figure json of every ticker and
+    # the clientside data), then the CURRENT file is switched to it with
+    # os.replace: a worker sees either the previous version or the new one
+    # complete, never a partial one. Workers only read the versions, so the
+    # frames are mapped from the same files (one copy in the page cache) and
+    # no figure is built twice. The refresh itself is run by the one worker
+    # holding refresh.lock, another one takes it over if that worker dies.
+    # A worker records the version it reads in worker.<pid> when attaching,
+    # since its frames are mapped from it on demand; prune keeps those.
+
+    def __init__(self, root, keep=KEEP_VERSIONS, min_age=MIN_AGE):
+
+        self.root = root
+        self.keep = keep
+        self.min_age = min_age
+        self.lock_file = None
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def current_path(self):
+        return os.path.join(self.root, 'CURRENT')
+
+    def current(self):
+        # name of the version workers should use, None before a first publish
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def attach(self, version=None):
+        # the given or current version, None when nothing is published
+        version = version if version is not None else self.current()
+        if version is None:
+            return None
+        attached = SharedVersion(os.path.join(self.root, version), version)
+        self.register(version)
+        return attached
+
+    def register(self, version):
+        # records the version this process reads
+        path = os.path.join(self.root, f'worker.{os.getpid()}')
+        with open(path + '.tmp', 'w') as f:
+            f.write(version)
+        os.replace(path + '.tmp', path)
+
+    def inUse(self):
+        # versions read by the worker processes still alive, the files of
+        # the dead ones are removed
+        versions = set()
+        for name in os.listdir(self.root):
+            prefix, _, pid = name.partition('.')
+            if prefix != 'worker' or not pid.isdigit():
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                os.remove(path)
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path) as f:
+                    versions.add(f.read().strip())
+            except OSError:
+                pass
+        return versions
+
+    def tryLock(self):
+        # True when this process is (or becomes) the one refreshing the data
+        if self.lock_file is not None:
+            return True
+        f = open(os.path.join(self.root, 'refresh.lock'), 'w')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self.lock_file = f
+        return True
+
+    def publish(self, snapshot, screener=None, figures=None, browser=None):
+        # publish a snapshot as a new version and make it the current one
+        # figures : function ticker -> figure json, browser : clientside data
+        version = snapshot.updated.strftime('%Y%m%dT%H%M%S%f')
+        path = os.path.join(self.root, version)
+        tmp = path + f'.tmp{os.getpid()}'
+        shutil.rmtree(tmp, ignore_errors=True)
+
+        store = Store(tmp)
+        for ticker in snapshot.tickers:
+            if isinstance(snapshot.frames, CompactFrames):
+                store.writeColumns(ticker, snapshot.frames.encoded(ticker))
+            else:
+                store.write(ticker, snapshot.frames[ticker])
+        Snapshot(store, snapshot.tickers, {}, snapshot.returns, snapshot.updated, snapshot.metrics).save()
+        if screener is not None:
+            screener.save(os.path.join(tmp, SCREENER_FILE))
+        if figures is not None:
+            os.makedirs(os.path.join(tmp, 'figures'))
+            for ticker in snapshot.tickers:
+                with open(os.path.join(tmp, 'figures', ticker + '.json'), 'w') as f:
+                    f.write(figures(ticker))
+        if browser is not None:
+            with open(os.path.join(tmp, 'browser.json'), 'w') as f:
+                json.dump(browser, f)
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+        with open(self.current_path + '.tmp', 'w') as f:
+            f.write(version)
+        os.replace(self.current_path + '.tmp', self.current_path)
+        logger.info('version %s published', version)
+        self.prune()
+        return version
+
+    def versions(self):
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)) and '.tmp' not in name)
+
+    def prune(self):
+        # remove the versions older than the last `keep`, except the current
+        # one, those a live worker still reads and those published less than
+        # min_age seconds ago (requests still running on a version a worker
+        # has just left, workers of another host)
+        used = self.inUse() | {self.current()}
+        now = time.time()
+        for version in self.versions()[:-self.keep]:
+            path = os.path.join(self.root, version)
+            try:
+                age = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            if version not in used and age >= self.min_age:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+
+    # publishes the snapshot of a data directory without the figures
+    parser = argparse.ArgumentParser(description='Publish the last refresh in the shared cache')
+    parser.add_argument('--data-dir', default=os.path.join(os.getcwd(), 'data'))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    snapshot = Snapshot.load(Store(args.data_dir))
+    if snapshot is None:
+        parser.error(f'no refresh saved in {args.data_dir}')
+    screener = ScreenerIndex.load(os.path.join(args.data_dir, SCREENER_FILE))
+    SharedCache(os.path.join(args.data_dir, SHARED_DIR)).publish(snapshot, screener)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+#signal encoding used by the engine
+BUY = 1
+SELL = -1
+NONE = 0
+
+
+def signalState(entry, exit, initial=0):
+    # Vectorized version of the buy_auto loop of the strat* methods.
+    # A position is opened on an entry bar while flat and closed on an exit bar
+    # while holding. Returns an int8 array of BUY / SELL / NONE codes with the
+    # shape of the inputs (1-D, or 2-D with one column per series).
+    # initial is the position (1 holding, 0 flat) before the first bar, to
+    # carry the state over consecutive chunks of a series.
+    entry = np.asarray(entry, dtype=bool)
+    exit = np.asarray(exit, dtype=bool)
+    shape = entry.shape
+    if entry.ndim == 1:
+        entry = entry[:, None]
+        exit = exit[:, None]
+    n = entry.shape[0]
+    initial = np.broadcast_to(np.asarray(initial, dtype=np.int8), entry.shape[1:])
+
+    #last event seen on each bar : 1 entry, 0 exit (exit wins on the same bar)
+    event = np.where(exit, 0, 1).astype(np.int8)
+    rows = np.where(entry | exit, np.arange(n)[:, None], -1)
+    rows = np.maximum.accumulate(rows, axis=0)
+    held = np.take_along_axis(event, np.maximum(rows, 0), axis=0)
+    held = np.where(rows < 0, initial, held)
+
+    prev = np.empty_like(held)
+    prev[:1] = initial
+    prev[1:] = held[:-1]
+
+    codes = np.zeros(held.shape, dtype=np.int8)
+    codes[(held == 1) & (prev == 0)] = BUY
+    #the loop buys then sells on a bar where both conditions hold, so it
+    #always ends up writing "sell" there
+    codes[((held == 0) & (prev == 1)) | (entry & exit)] = SELL
+
+    return codes.reshape(shape)
+
+
+def lastState(codes, initial=0):
+    # position after the last bar of a 1-D code array, initial when it has no trade
+    codes = np.asarray(codes)
+    active = np.flatnonzero(codes != NONE)
+    return int(codes[active[-1]] == BUY) if len(active) else initial
+
+
+def decodeSignals(codes):
+    # int8 codes -> the None / "buy" / "sell" object column used in the frames
+    out = np.full(np.shape(codes), None, dtype=object)
+    out[codes == BUY] = "buy"
+    out[codes == SELL] = "sell"
+    return out
+
+
+def encodeSignals(signal):
+    # None / "buy" / "sell" column -> int8 codes
+    if hasattr(signal, 'codes'):
+        #categorical column, mapped through its categories (code -1 is missing)
+        lookup = [BUY if c == "buy" else SELL if c == "sell" else NONE for c in signal.categories]
+        return np.array(lookup + [NONE], dtype=np.int8)[signal.codes]
+    signal = np.asarray(signal, dtype=object)
+    codes = np.zeros(signal.shape, dtype=np.int8)
+    codes[signal == "buy"] = BUY
+    codes[signal == "sell"] = SELL
+    return codes
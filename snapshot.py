@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from compact import CompactFrames
+
+
+class StoreFrames:
+    # Frames of a snapshot read from the store when asked for, the last
+    # `cache_size` ones kept. A process attached to a shared store then only
+    # holds the frames it is using instead of the whole universe.
+
+    def __init__(self, store, tickers, cache_size=4):
+
+        self.store = store
+        self.tickers = list(tickers)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        ticker = self.tickers[key] if isinstance(key, int) else key
+        with self.lock:
+            if ticker in self.cache:
+                self.cache.move_to_end(ticker)
+                return self.cache[ticker]
+        df = self.store.read(ticker)
+        with self.lock:
+            self.cache[ticker] = df
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return df
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __iter__(self):
+        return (self[ticker] for ticker in self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self.tickers
+
+    def keys(self):
+        return list(self.tickers)
+
+
+class Snapshot:
+    # Results the dashboard needs (tickers, frames, returns per strategy),
+    # persisted after every refresh: the returns in snapshot.json, the frames
+    # in the store, so the app can start from the last run without network.
+
+    def __init__(self, store, tickers, frames, returns, updated=None, metrics=None):
+
+        self.store = store
+        self.tickers = list(tickers)
+        self.frames = frames
+        self.returns = returns
+        #return / volatility / sharpe / max drawdown by ticker and strategy
+        self.metrics = metrics if metrics is not None else {}
+        self.updated = updated if updated is not None else datetime.now()
+
+    @property
+    def path(self):
+        return os.path.join(self.store.data_dir, 'snapshot.json')
+
+    @property
+    def lastDate(self):
+        # date of the most recent bar across the tickers
+        dates = [self.store.lastDate(ticker) for ticker in self.tickers]
+        dates = [date for date in dates if date is not None]
+        return max(dates) if dates else None
+
+    def save(self):
+        content = {
+            'updated': self.updated.isoformat(),
+            'tickers': self.tickers,
+            'returns': {ticker: returns['crypto'].to_dict() for ticker, returns in self.returns.items()},
+            'metrics': self.metrics,
+        }
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(content, f)
+        os.replace(tmp, self.path)
+
+    @classmethod
+    def load(cls, store, compact=False, lazy=False, prices32=False):
+        # None when no refresh has been saved yet
+        # compact keeps the frames in a CompactFrames instead of a dict (with
+        # float32 prices too when prices32), lazy reads them from the store
+        # when asked for (StoreFrames)
+        path = os.path.join(store.data_dir, 'snapshot.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            content = json.load(f)
+        tickers = [ticker for ticker in content['tickers'] if ticker in store.manifest]
+        if lazy:
+            frames = StoreFrames(store, tickers)
+        else:
+            frames = {ticker: store.read(ticker) for ticker in tickers}
+        if compact and not lazy:
+            frames = CompactFrames(frames, prices32=prices32)
+        returns = {ticker: pd.DataFrame({'crypto': pd.Series(content['returns'][ticker])})
+                   for ticker in tickers}
+        metrics = {ticker: content.get('metrics', {}).get(ticker, {}) for ticker in tickers}
+        return cls(store, tickers, frames, returns, datetime.fromisoformat(content['updated']), metrics)
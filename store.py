@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from signals import encodeSignals, decodeSignals
+
+
+class Store:
+    # Columnar on-disk store for bars, indicators and signals.
+    # Every ticker gets a directory with one raw binary file per column
+    # (<data_dir>/<ticker>/<column>.bin) that is read back through np.memmap,
+    # so a read only touches the rows and columns that are asked for.
+    # manifest.json keeps the row count, date range and dtypes of each ticker.
+
+    def __init__(self, data_dir):
+
+        self.data_dir = data_dir
+        self.manifest_path = os.path.join(data_dir, 'manifest.json')
+        os.makedirs(data_dir, exist_ok=True)
+        self.manifest = self.loadManifest()
+
+    def loadManifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def saveManifest(self):
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def tickers(self):
+        return sorted(self.manifest)
+
+    def lastDate(self, ticker):
+        if ticker not in self.manifest or not self.manifest[ticker]['rows']:
+            return None
+        return pd.Timestamp(self.manifest[ticker]['end'])
+
+    def fingerprint(self, ticker):
+        # changes whenever the data of the ticker is rewritten or appended to,
+        # without reading the columns
+        entry = self.manifest[ticker]
+        mtimes = [os.stat(self.columnPath(ticker, col)).st_mtime_ns for col in entry['columns']]
+        return hashlib.sha1(json.dumps([entry, mtimes], sort_keys=True).encode()).hexdigest()
+
+    def columnPath(self, ticker, column):
+        return os.path.join(self.data_dir, ticker, column + '.bin')
+
+    def statePath(self, ticker, name):
+        # json files kept next to the columns of a ticker (incremental states)
+        os.makedirs(os.path.join(self.data_dir, ticker), exist_ok=True)
+        return os.path.join(self.data_dir, ticker, name + '.json')
+
+    def encode(self, df):
+        columns = {}
+        for col in df.columns:
+            values = df[col].values
+            if col == 'Date':
+                values = np.asarray(values, dtype='datetime64[ns]').view('int64')
+            elif 'signal' in col:
+                #int8 codes are taken as they are
+                values = values if getattr(values, 'dtype', None) == np.int8 else encodeSignals(values)
+            elif values.dtype.kind not in 'biuf':
+                raise ValueError(f'column {col} of type {values.dtype} cannot be stored')
+            columns[col] = np.ascontiguousarray(values)
+        return columns
+
+    def write(self, ticker, df):
+        # replace everything stored for this ticker
+        self.writeColumns(ticker, self.encode(df))
+
+    def writeColumns(self, ticker, columns):
+        # write of columns already encoded (int64 dates, int8 signals)
+        os.makedirs(os.path.join(self.data_dir, ticker), exist_ok=True)
+        for name in os.listdir(os.path.join(self.data_dir, ticker)):
+            if name.endswith('.bin'):
+                os.remove(os.path.join(self.data_dir, ticker, name))
+        for col, values in columns.items():
+            values.tofile(self.columnPath(ticker, col))
+        self.manifest[ticker] = {
+            'rows': len(columns['Date']),
+            'columns': {col: values.dtype.str for col, values in columns.items()},
+        }
+        self.updateRange(ticker, columns['Date'])
+        self.saveManifest()
+
+    def append(self, ticker, df):
+        # append the bars of df that are newer than the last stored date
+        if ticker not in self.manifest:
+            return self.write(ticker, df)
+        entry = self.manifest[ticker]
+        last = self.lastDate(ticker)
+        if last is not None:
+            df = df.loc[df['Date'] > last]
+        if df.empty:
+            return 0
+        if set(df.columns) != set(entry['columns']):
+            raise ValueError(f'columns of {ticker} do not match the stored ones')
+        columns = self.encode(df)
+        for col, values in columns.items():
+            dtype = np.dtype(entry['columns'][col])
+            with open(self.columnPath(ticker, col), 'r+b') as f:
+                #drop whatever an interrupted append left after the last row
+                f.truncate(entry['rows'] * dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(values.astype(dtype).tobytes())
+        entry['rows'] += len(df)
+        self.updateRange(ticker, columns['Date'])
+        self.saveManifest()
+        return len(df)
+
+    def updateRange(self, ticker, dates):
+        entry = self.manifest[ticker]
+        if len(dates) == 0:
+            return
+        if 'start' not in entry:
+            entry['start'] = str(pd.Timestamp(dates[0]))
+        entry['end'] = str(pd.Timestamp(dates[-1]))
+
+    def column(self, ticker, col):
+        entry = self.manifest[ticker]
+        if not entry['rows']:
+            return np.empty(0, dtype=entry['columns'][col])
+        return np.memmap(self.columnPath(ticker, col), dtype=entry['columns'][col],
+                         mode='r', shape=(entry['rows'],))
+
+    def read(self, ticker, start=None, end=None, columns=None, rows=None):
+        # rows : slice of row positions, read instead of the dates start / end
+
+        entry = self.manifest[ticker]
+        columns = list(entry['columns']) if columns is None else list(columns)
+        if 'Date' not in columns:
+            columns = ['Date'] + columns
+
+        #only the rows between start and end are paged in
+        dates = self.column(ticker, 'Date')
+        if rows is not None:
+            lo, hi, _ = rows.indices(len(dates))
+        else:
+            lo = 0 if start is None else np.searchsorted(dates, pd.Timestamp(start).value, 'left')
+            hi = len(dates) if end is None else np.searchsorted(dates, pd.Timestamp(end).value, 'right')
+
+        data = {}
+        for col in columns:
+            values = np.array(self.column(ticker, col)[lo:hi])
+            if col == 'Date':
+                values = values.view('datetime64[ns]')
+            elif 'signal' in col:
+                values = decodeSignals(values)
+            data[col] = values
+        return pd.DataFrame(data, columns=columns)
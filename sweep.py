@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from signals import signalState, BUY, SELL
+
+#number of parameter combinations evaluated per engine run
+CHUNK = 256
+
+
+def makeGrid(fast=range(5, 105, 5), slow=range(10, 410, 10),
+             window=(10, 20, 50, 100, 200), width=np.arange(0.1, 3.05, 0.1).round(2),
+             period=(7, 10, 14, 21, 28), low=range(10, 50, 5), high=range(55, 95, 5)):
+    # every combination of the given values, one frame of parameters per strategy
+    ma = [(f, s) for f, s in itertools.product(fast, slow) if f < s]
+    return {
+        'moving average': pd.DataFrame(ma, columns=['fast', 'slow']),
+        'bollinger': pd.DataFrame(list(itertools.product(window, width)), columns=['window', 'width']),
+        'rsi': pd.DataFrame(list(itertools.product(period, low, high)), columns=['period', 'low', 'high']),
+    }
+
+
+class SharedRolling:
+    # Prefix sums of the closes and of the RSI gains/losses of one ticker.
+    # Any SMA or RSI window is then O(n) from them, and each window is built
+    # once and shared by all the combinations that use it.
+
+    def __init__(self, close):
+
+        self.close = np.asarray(close, dtype=float)
+        self.n = len(self.close)
+        self.cs = np.r_[0.0, np.cumsum(self.close)]
+        #RSI is computed on the second difference of the closes, like computeIndicators
+        delta = np.diff(self.close, n=2)
+        self.cs_up = np.r_[0.0, np.cumsum(np.where(delta > 0, delta, 0.0))]
+        self.cs_down = np.r_[0.0, np.cumsum(np.where(delta < 0, -delta, 0.0))]
+        self.cache = {}
+
+    def sma(self, window):
+        key = ('sma', window)
+        if key not in self.cache:
+            out = np.full(self.n, np.nan)
+            if self.n >= window:
+                out[window - 1:] = (self.cs[window:] - self.cs[:-window]) / window
+            self.cache[key] = out
+        return self.cache[key]
+
+    def smaStd(self, window, start=0, stop=None):
+        # population std of the valid values of sma(window) within [start, stop)
+        key = ('moments', window)
+        if key not in self.cache:
+            sma = self.sma(window)
+            valid = ~np.isnan(sma)
+            values = np.where(valid, sma, 0.0)
+            self.cache[key] = (np.r_[0, np.cumsum(valid)],
+                               np.r_[0.0, np.cumsum(values)],
+                               np.r_[0.0, np.cumsum(values ** 2)])
+        count, total, squares = self.cache[key]
+        stop = self.n if stop is None else stop
+        k = count[stop] - count[start]
+        if k == 0:
+            return np.nan
+        mean = (total[stop] - total[start]) / k
+        return np.sqrt(max((squares[stop] - squares[start]) / k - mean ** 2, 0.0))
+
+    def rsi(self, period):
+        key = ('rsi', period)
+        if key not in self.cache:
+            out = np.full(self.n, np.nan)
+            if self.n - 2 >= period:
+                up = (self.cs_up[period:] - self.cs_up[:-period]) / period
+                down = (self.cs_down[period:] - self.cs_down[:-period]) / period
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    out[period + 1:] = 100.0 - (100.0 / (1.0 + up / down))
+            self.cache[key] = out
+        return self.cache[key]
+
+
+def evaluate(codes, high, low, close):
+    # accounting of Data.get_returns for each column of a signal code matrix:
+    # buys pay the Low, sells receive the High, and a position still open is
+    # valued at the Close of its buy bar. Missing prices count as 0 so one NaN
+    # bar does not turn every combination into NaN.
+    buys = codes == BUY
+    sells = codes == SELL
+    high = np.where(np.isnan(high), 0.0, high)
+    low = np.where(np.isnan(low), 0.0, low)
+    value = high @ sells - low @ buys
+    active = codes != 0
+    trades = active.sum(axis=0)
+    last = len(codes) - 1 - np.argmax(active[::-1], axis=0)
+    cols = np.arange(codes.shape[1])
+    still_open = (trades > 0) & (codes[last, cols] == BUY)
+    value = value + np.where(still_open, close[last], 0.0)
+    return value, trades
+
+
+def conditions(rolling, strategy, params, start, stop, band_std):
+    # entry / exit matrices (bars x combinations) of one chunk of parameters
+    close = rolling.close[start:stop, None]
+    if strategy == 'moving average':
+        fast = np.column_stack([rolling.sma(w)[start:stop] for w in params['fast']])
+        slow = np.column_stack([rolling.sma(w)[start:stop] for w in params['slow']])
+        return fast > slow, fast < slow
+    if strategy == 'bollinger':
+        mid = np.column_stack([rolling.sma(w)[start:stop] for w in params['window']])
+        width = params['width'].values * band_std
+        return mid - width > close, mid + width < close
+    if strategy == 'rsi':
+        rsi = np.column_stack([rolling.rsi(p)[start:stop] for p in params['period']])
+        return rsi < params['low'].values, rsi > params['high'].values
+    raise ValueError(f'unknown strategy {strategy}')
+
+
+def sweepTicker(df, grid, start=0, stop=None, rolling=None, band_std=None):
+    # evaluate every combination of the grid on the bars [start, stop) of df
+
+    if rolling is None:
+        rolling = SharedRolling(df['Close'].values)
+    stop = len(df) if stop is None else stop
+    if band_std is None:
+        #width of the bands relative to the std of the full 200 SMA, as in computeIndicators
+        band_std = rolling.smaStd(200)
+    high = df['High'].values[start:stop].astype(float)
+    low = df['Low'].values[start:stop].astype(float)
+    close = rolling.close[start:stop]
+
+    results = []
+    for strategy, params in grid.items():
+        for i in range(0, len(params), CHUNK):
+            chunk = params.iloc[i:i + CHUNK]
+            codes = signalState(*conditions(rolling, strategy, chunk, start, stop, band_std))
+            value, trades = evaluate(codes, high, low, close)
+            results.append(chunk.assign(strategy=strategy, value=value, trades=trades))
+    return pd.concat(results, ignore_index=True, sort=False)
+
+
+def sweepWorker(args):
+    ticker, df, grid = args
+    return sweepTicker(df, grid).assign(ticker=ticker)
+
+
+def sweep(frames, grid=None, workers=None):
+    # ranked results of the grid for every ticker, tickers spread over a process pool
+
+    grid = makeGrid() if grid is None else grid
+    tasks = [(ticker, df[['High', 'Low', 'Close']], grid) for ticker, df in frames.items()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(sweepWorker, tasks))
+
+    table = pd.concat(results, ignore_index=True, sort=False)
+    table['rank'] = table.groupby(['ticker', 'strategy'])['value'].rank(ascending=False, method='first',
+                                                                          na_option='bottom').astype(int)
+    columns = ['ticker', 'strategy', 'rank', 'value', 'trades'] + [c for c in table.columns if c not in
+               ('ticker', 'strategy', 'rank', 'value', 'trades')]
+    return table[columns].sort_values(['ticker', 'strategy', 'rank']).reset_index(drop=True)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from benchmark import syntheticData
+from code2 import Data
+from pipeline import Ingestion
+from providers import BAR_COLUMNS
+
+BANDS = ['low_boll', 'high_boll']
+
+
+def stored(data, bars):
+    data.exportData(data.computeStrategies(data.computeIndicators(bars.copy())), 'T-USD')
+
+
+def full(data, bars):
+    return data.computeStrategies(data.computeIndicators(bars.copy()))
+
+
+def assertSignals(result, expected):
+    for col in [c for c in expected.columns if 'signal' in c]:
+        assert (result[col].fillna('').values == expected[col].fillna('').values).all(), col
+
+
+def test_incremental_refresh_matches_full(tmp_path):
+    bars = syntheticData(1100, seed=0)[BAR_COLUMNS]
+    data = Data(str(tmp_path))
+    stored(data, bars.iloc[:1000])
+    #a bar at a time, then a larger download
+    for n in list(range(1001, 1011)) + [1100]:
+        result = data.extendFrame('T-USD', bars.iloc[:n].copy())
+        assert result is not None
+        assert len(result) == n
+
+    expected = full(data, bars)
+    assertSignals(result, expected)
+    for col in expected.columns.drop(['Date'] + BANDS):
+        if 'signal' not in col:
+            np.testing.assert_allclose(result[col].values, expected[col].values, rtol=1e-9, err_msg=col)
+    #each bar keeps the width of the bands known when it was added, the last
+    #one that of the whole history
+    np.testing.assert_allclose(result[BANDS].values[-1], expected[BANDS].values[-1], rtol=1e-9)
+
+
+def test_fallback_when_the_signals_would_differ(tmp_path):
+    #a move that widens the bands enough to change the breakouts of stored bars
+    bars = syntheticData(1300, seed=1)[BAR_COLUMNS]
+    bars.loc[1000:, ['High', 'Low', 'Open', 'Close']] *= 4
+    data = Data(str(tmp_path))
+    stored(data, bars.iloc[:1000])
+    assert data.extendFrame('T-USD', bars.copy()) is None
+    assert data.store.manifest['T-USD']['rows'] == 1000
+
+    #the pipeline recomputes the whole frame
+    result = Ingestion(data).process(bars.copy(), 'T-USD')
+    expected = full(data, bars)
+    assertSignals(result, expected)
+    assertSignals(data.store.read('T-USD'), expected)
+    pd.testing.assert_frame_equal(data.store.read('T-USD').drop(columns=['signal_bo', 'signal_ma', 'signal_rsi']),
+                                  expected.drop(columns=['signal_bo', 'signal_ma', 'signal_rsi']), check_dtype=False)
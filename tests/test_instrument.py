@@ -0,0 +1,64 @@
+import threading
+import tracemalloc
+
+import pytest
+
+import instrument
+
+
+@pytest.fixture
+def memory():
+    instrument.metrics.reset()
+    instrument.enable(memory=True)
+    yield instrument.metrics
+    instrument.disable()
+    instrument.MEMORY = False
+    tracemalloc.stop()
+    instrument.metrics.reset()
+
+
+def allocate(size):
+    block = bytearray(size)
+    return len(block)
+
+
+def spans(metrics):
+    return {s['span']: s for s in metrics.toJson()}
+
+
+def test_nested_peaks(memory):
+    with instrument.span('outer'):
+        allocate(2 * 10 ** 6)
+        with instrument.span('inner'):
+            allocate(10 ** 7)
+    result = spans(memory)
+    assert 0.9 * 10 ** 7 <= result['inner']['peak_bytes'] < 2 * 10 ** 7
+    assert result['outer']['peak_bytes'] >= result['inner']['peak_bytes']
+
+
+def test_overlapping_threads_have_no_peak(memory):
+    started, done = threading.Event(), threading.Event()
+
+    def worker():
+        with instrument.span('worker'):
+            started.set()
+            allocate(10 ** 7)
+            done.wait()
+
+    thread = threading.Thread(target=worker)
+    with instrument.span('main'):
+        thread.start()
+        started.wait()
+        allocate(10 ** 6)
+        done.set()
+        thread.join()
+    #both spans overlapped: calls counted, no memory peak
+    result = spans(memory)
+    assert result['main']['calls'] == result['worker']['calls'] == 1
+    assert result['main']['peak_bytes'] == result['worker']['peak_bytes'] == 0
+
+    #alone again, the peaks are measured
+    with instrument.span('main'):
+        allocate(10 ** 6)
+    assert spans(memory)['main']['peak_bytes'] >= 0.9 * 10 ** 6
+    assert not instrument.open_spans
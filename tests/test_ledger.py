@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from benchmark import syntheticData
+from code2 import Data
+from ledger import EquityState, portfolioValue
+from signals import encodeSignals
+
+STRATEGIES = ['signal_bo', 'signal_ma', 'signal_rsi']
+
+
+@pytest.fixture
+def frame(tmp_path):
+    data = Data(str(tmp_path))
+    return data.computeStrategies(data.computeIndicators(syntheticData(2000, seed=3)))
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES)
+def test_incremental_metrics(frame, strategy):
+    #the state updated bar by bar ends where the state of the whole frame starts
+    state = EquityState.fromFrame(frame.iloc[:1200], strategy)
+    new = frame.iloc[1200:]
+    for row, code in zip(new.itertuples(index=False), encodeSignals(new[strategy].values)):
+        state.update(row.Date, row.High, row.Low, row.Close, code)
+    expected = EquityState.fromFrame(frame, strategy)
+    assert state.trades == expected.trades
+    assert state.metrics() == pytest.approx(expected.metrics(), nan_ok=True)
+
+
+@pytest.mark.parametrize('strategy', STRATEGIES)
+def test_portfolio_value(frame, strategy):
+    #each round trip multiplies the value by its sell High over its buy Low
+    codes = encodeSignals(frame[strategy].values)
+    value = portfolioValue(codes, frame['High'].values, frame['Low'].values, frame['Close'].values)
+    rows = np.flatnonzero(codes != 0)
+    growth = 1.0
+    for buy, sell in zip(rows[::2], rows[1::2]):
+        growth *= frame['High'].values[sell] / frame['Low'].values[buy]
+        assert value[sell - rows[0] + 1] == pytest.approx(growth)
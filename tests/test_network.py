@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from network import CacheMiss, CachedSession
+
+
+class Handler(BaseHTTPRequestHandler):
+    # pages of the stand-in server : path -> (headers, body), ETag validated
+
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        headers, body = self.server.pages[self.path]
+        if headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.pages = {}
+    server.hits = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fresh_response_is_served_from_the_cache(tmp_path, server):
+    server.pages['/bars'] = ({'Cache-Control': 'max-age=60'}, b'bars')
+    session = CachedSession(str(tmp_path))
+    assert session.get(server.url + '/bars').content == b'bars'
+    assert session.get(server.url + '/bars').content == b'bars'
+    assert CachedSession(str(tmp_path)).get(server.url + '/bars').content == b'bars'
+    assert server.hits == ['/bars']
+
+
+def test_header_names_are_case_insensitive(tmp_path, server):
+    server.pages['/bars'] = ({'cache-control': 'no-cache', 'etag': '"v1"'}, b'bars')
+    session = CachedSession(str(tmp_path))
+    session.get(server.url + '/bars')
+    #revalidated every time, answered by a 304
+    assert session.get(server.url + '/bars').content == b'bars'
+    assert len(server.hits) == 2
+
+
+def test_no_store(tmp_path, server):
+    server.pages['/bars'] = ({'Cache-Control': 'no-store'}, b'bars')
+    session = CachedSession(str(tmp_path))
+    session.get(server.url + '/bars')
+    session.get(server.url + '/bars')
+    assert len(server.hits) == 2
+    assert not os.listdir(str(tmp_path))
+
+
+def test_cache_only(tmp_path, server):
+    server.pages['/bars'] = ({'Cache-Control': 'no-cache'}, b'bars')
+    CachedSession(str(tmp_path)).get(server.url + '/bars')
+    session = CachedSession(str(tmp_path), cache_only=True)
+    assert session.get(server.url + '/bars').content == b'bars'
+    with pytest.raises(CacheMiss):
+        session.get(server.url + '/other')
+    assert server.hits == ['/bars']
+
+
+def test_identical_requests_in_flight(tmp_path, server):
+    server.pages['/bars'] = ({}, b'bars')
+    session = CachedSession(str(tmp_path))
+    handle = Handler.do_GET
+    Handler.do_GET = lambda self: (time.sleep(0.2), handle(self))
+    try:
+        threads = [threading.Thread(target=session.get, args=(server.url + '/bars',)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        Handler.do_GET = handle
+    assert server.hits == ['/bars']
+
+
+def test_stale_entries_are_pruned(tmp_path, server):
+    for day in range(3):
+        server.pages[f'/bars?period2={day}'] = ({}, b'x' * 1000)
+    session = CachedSession(str(tmp_path))
+    for day in range(3):
+        session.get(server.url + '/bars', params={'period2': day})
+    #the first response was stored ten days ago, the second two days ago
+    for day, age in ((0, 10), (1, 2)):
+        path = session.path(session.key(server.url + '/bars', {'period2': day}))
+        for ext in ('.json', '.body'):
+            os.utime(path + ext, (time.time() - age * 24 * 3600,) * 2)
+
+    def cached():
+        keys = {name.split('.')[0] for name in os.listdir(str(tmp_path))}
+        return sorted(session.load(key)[0]['url'][-1] for key in keys)
+
+    #older than a week, then the oldest while over max_size
+    CachedSession(str(tmp_path))
+    assert cached() == ['1', '2']
+    CachedSession(str(tmp_path), max_size=1500)
+    assert cached() == ['2']
+    #a cache-only session keeps everything
+    CachedSession(str(tmp_path), cache_only=True, max_age=0)
+    assert cached() == ['2']
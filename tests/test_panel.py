@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import syntheticData
+from code2 import Data
+
+
+@pytest.fixture
+def frames():
+    #staggered listings, a ticker missing interior dates the others have
+    frames = {}
+    for i in range(4):
+        lag = i * 150
+        df = syntheticData(1500 - lag, seed=i)
+        frames[f'T{i}-USD'] = df.assign(Date=df['Date'] + pd.Timedelta(days=lag))
+    gaps = frames['T1-USD']
+    frames['T1-USD'] = gaps.drop(index=[300, 301, 302, 900]).reset_index(drop=True)
+    frames['T4-USD'] = syntheticData(150, seed=4)
+    return frames
+
+
+def test_same_values_as_per_ticker(tmp_path, frames):
+    data = Data(str(tmp_path))
+    panel = data.computeUniverse({ticker: df.copy() for ticker, df in frames.items()})
+
+    assert list(panel) == list(frames)
+    for ticker, df in frames.items():
+        expected = data.computeStrategies(data.computeIndicators(df.copy()))
+        result = panel[ticker]
+        assert list(result['Date']) == list(expected['Date'])
+        assert sorted(result.columns) == sorted(expected.columns)
+        for col in expected.columns:
+            if 'signal' in col or col == 'Date':
+                assert (result[col].fillna('').values == expected[col].fillna('').values).all(), (ticker, col)
+            else:
+                np.testing.assert_allclose(result[col].values, expected[col].values, rtol=1e-9, err_msg=col)
@@ -0,0 +1,123 @@
+import time
+
+import pandas as pd
+import pytest
+
+from benchmark import syntheticData
+from code2 import Data
+from network import CacheMiss
+from pipeline import RATE, Ingestion
+from providers import BAR_COLUMNS, FileProvider
+
+
+#bars in the csv files at first, the history goes on for NEW more bars
+BARS = 1000
+NEW = 10
+
+
+def writeBars(path, frames, n):
+    for ticker, df in frames.items():
+        df.iloc[:n].to_csv(path / f'{ticker}.csv', index=False)
+
+
+@pytest.fixture
+def bars(tmp_path):
+    #csv files of the FileProvider
+    path = tmp_path / 'bars'
+    path.mkdir()
+    frames = {f'T{i}-USD': syntheticData(BARS + NEW, seed=i)[BAR_COLUMNS] for i in range(3)}
+    writeBars(path, frames, BARS)
+    return path, frames
+
+
+class FlakyProvider(FileProvider):
+    # fails the first downloads of the tickers, failures : {ticker: count}
+
+    def __init__(self, path, failures, error=ConnectionError):
+        super().__init__(path)
+        self.failures = failures
+        self.error = error
+        self.calls = {}
+
+    def getBars(self, ticker, start, end):
+        self.calls[ticker] = self.calls.get(ticker, 0) + 1
+        if self.calls[ticker] <= self.failures.get(ticker, 0):
+            raise self.error(f'download {self.calls[ticker]} of {ticker}')
+        return super().getBars(ticker, start, end)
+
+
+def test_round_trip(tmp_path, bars):
+    path, frames = bars
+    data = Data(str(tmp_path / 'data'), provider=FileProvider(str(path)))
+    result, errors = Ingestion(data, workers=2).run(list(frames))
+
+    assert not errors
+    assert list(result) == list(frames)
+    for ticker, df in frames.items():
+        expected = data.computeStrategies(data.computeIndicators(df.iloc[:BARS].copy()))
+        pd.testing.assert_frame_equal(result[ticker], expected, check_dtype=False)
+        pd.testing.assert_frame_equal(data.store.read(ticker), expected, check_dtype=False)
+
+
+def test_incremental_refresh(tmp_path, bars):
+    path, frames = bars
+    data = Data(str(tmp_path / 'data'), provider=FileProvider(str(path)))
+    ingestion = Ingestion(data, workers=2)
+    ingestion.run(list(frames))
+
+    #new bars in the csv files are appended to the stored frames
+    writeBars(path, frames, BARS + NEW)
+    result, errors = ingestion.run(list(frames))
+
+    assert not errors
+    for ticker, df in frames.items():
+        assert len(result[ticker]) == BARS + NEW
+        pd.testing.assert_frame_equal(data.store.read(ticker, columns=BAR_COLUMNS), df, check_dtype=False)
+
+
+def test_retries(tmp_path, bars):
+    path, frames = bars
+    provider = FlakyProvider(str(path), {ticker: 2 for ticker in frames})
+    data = Data(str(tmp_path / 'data'), provider=provider)
+    result, errors = Ingestion(data, workers=2, retries=2, backoff=0).run(list(frames))
+
+    assert not errors
+    assert list(result) == list(frames)
+    assert provider.calls == {ticker: 3 for ticker in frames}
+
+
+def test_failures_are_reported(tmp_path, bars):
+    path, frames = bars
+    provider = FlakyProvider(str(path), {'T1-USD': 10, 'T2-USD': 10})
+    data = Data(str(tmp_path / 'data'), provider=provider)
+    tickers = list(frames) + ['MISSING-USD']
+    result, errors = Ingestion(data, workers=2, retries=1, backoff=0).run(tickers)
+
+    #the missing csv and the tickers still failing after the retry do not stop T0-USD
+    assert list(result) == ['T0-USD']
+    assert set(errors) == {'T1-USD', 'T2-USD', 'MISSING-USD'}
+    assert isinstance(errors['MISSING-USD'], FileNotFoundError)
+    assert provider.calls['T1-USD'] == 2
+    assert 'T1-USD' not in data.store.tickers()
+
+
+def test_cache_miss_is_not_retried(tmp_path, bars):
+    path, frames = bars
+    provider = FlakyProvider(str(path), {ticker: 10 for ticker in frames}, error=CacheMiss)
+    data = Data(str(tmp_path / 'data'), provider=provider)
+    result, errors = Ingestion(data, workers=2, retries=3, backoff=0).run(list(frames))
+
+    assert not result
+    assert all(isinstance(e, CacheMiss) for e in errors.values())
+    assert provider.calls == {ticker: 1 for ticker in frames}
+
+
+def test_downloads_are_rate_limited(tmp_path, bars):
+    path, frames = bars
+    provider = FileProvider(str(path))
+    provider.host = 'example.com'
+    data = Data(str(tmp_path / 'data'), provider=provider)
+    tickers = list(frames) * 3
+    start = time.perf_counter()
+    Ingestion(data, workers=len(tickers), incremental=False).run(tickers)
+    assert time.perf_counter() - start >= (len(tickers) - 1) / RATE
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from benchmark import syntheticData
+from code2 import Data
+from screener import ScreenerIndex
+from shared import SharedCache
+from snapshot import Snapshot
+
+
+def publish(cache, store, day, tickers=('T0-USD', 'T1-USD')):
+    frames = {ticker: store.read(ticker) for ticker in tickers}
+    returns = {ticker: pd.DataFrame({'crypto': pd.Series({'Moving average': float(day)})}) for ticker in tickers}
+    snapshot = Snapshot(store, tickers, frames, returns, datetime(2021, 1, 1) + timedelta(days=day))
+    screener = ScreenerIndex()
+    for ticker, df in frames.items():
+        screener.updateFrame(ticker, df)
+    return cache.publish(snapshot, screener, figures=lambda ticker: f'{{"ticker": "{ticker}", "day": {day}}}')
+
+
+@pytest.fixture
+def store(tmp_path):
+    data = Data(str(tmp_path / 'data'))
+    for i in range(2):
+        data.exportData(data.computeStrategies(data.computeIndicators(syntheticData(500, seed=i))), f'T{i}-USD')
+    return data.store
+
+
+def age(cache, version, seconds):
+    path = os.path.join(cache.root, version)
+    os.utime(path, (time.time() - seconds,) * 2)
+
+
+def test_publish_and_attach(tmp_path, store):
+    cache = SharedCache(str(tmp_path / 'shared'))
+    assert cache.attach() is None
+    version = publish(cache, store, 0)
+
+    attached = SharedCache(str(tmp_path / 'shared')).attach()
+    assert attached.version == version == cache.current()
+    assert attached.snapshot.tickers == ['T0-USD', 'T1-USD']
+    pd.testing.assert_frame_equal(attached.snapshot.frames['T1-USD'], store.read('T1-USD'))
+    assert attached.snapshot.returns['T0-USD']['crypto']['Moving average'] == 0
+    assert attached.figure('T1-USD') == {'ticker': 'T1-USD', 'day': 0}
+    assert attached.figure('MISSING-USD') is None
+    assert len(attached.screener) == 2
+    assert not [name for name in os.listdir(cache.root) if '.tmp' in name]
+
+
+def test_one_refreshing_worker(tmp_path):
+    first = SharedCache(str(tmp_path))
+    second = SharedCache(str(tmp_path))
+    assert first.tryLock() and first.tryLock()
+    assert not second.tryLock()
+    #the lock is released with the worker holding it
+    first.lock_file.close()
+    assert second.tryLock()
+
+
+def test_prune_keeps_the_versions_in_use(tmp_path, store):
+    cache = SharedCache(str(tmp_path / 'shared'), keep=1, min_age=60)
+    versions = [publish(cache, store, day) for day in range(2)]
+    #recently published versions are kept
+    assert cache.versions() == versions
+
+    #a live worker still reads the first version, a dead one the second
+    worker = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    try:
+        for process, version in ((worker, versions[0]), (dead, versions[1])):
+            with open(os.path.join(cache.root, f'worker.{process.pid}'), 'w') as f:
+                f.write(version)
+        for version in versions:
+            age(cache, version, 120)
+        versions.append(publish(cache, store, 2))
+        assert cache.versions() == [versions[0], versions[2]]
+        assert not os.path.exists(os.path.join(cache.root, f'worker.{dead.pid}'))
+        pd.testing.assert_frame_equal(cache.attach(versions[0]).snapshot.frames['T0-USD'], store.read('T0-USD'))
+    finally:
+        worker.kill()
+        worker.wait()
+
+    #once the worker is gone its version goes too; this process is attached to the first one
+    os.remove(os.path.join(cache.root, f'worker.{os.getpid()}'))
+    versions.append(publish(cache, store, 3))
+    assert cache.versions() == [versions[2], versions[3]]
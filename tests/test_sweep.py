@@ -0,0 +1,25 @@
+import numpy as np
+
+from benchmark import syntheticData
+from sweep import makeGrid, sweep, sweepTicker
+
+GRID = makeGrid(fast=(10, 20), slow=(50,), window=(20,), width=(0.5, 1.0), period=(14,), low=(30, 40), high=(70,))
+
+
+def test_missing_prices_do_not_spoil_the_values():
+    df = syntheticData(1500, seed=0)
+    df.loc[700, ['High', 'Low']] = np.nan
+    table = sweepTicker(df, GRID)
+    assert table['value'].notna().all()
+
+
+def test_missing_values_are_ranked_last():
+    #a position left open on a bar without a close has no value
+    df = syntheticData(1500, seed=0)
+    df.loc[1300::2, 'Close'] = np.nan
+    table = sweep({'T-USD': df}, GRID, workers=1)
+    assert table['value'].isna().any()
+    assert table['rank'].dtype.kind == 'i'
+    for _, group in table.groupby('strategy'):
+        assert list(group['rank']) == list(range(1, len(group) + 1))
+        assert not group['value'].isna().values[:group['value'].notna().sum()].any()
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from universe import FileUniverse, UniverseLoader, parseSymbols
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures',
+                       'cryptocurrencies.html')
+CONSENT = '<html><body><form action="/consent"><button>Accept all</button></form></body></html>'
+
+
+class Response:
+
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    # answers every request with the same page
+
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None):
+        self.calls += 1
+        return Response(self.text)
+
+
+def fixtureSymbols():
+    with open(FIXTURE) as f:
+        return parseSymbols(f.read())
+
+
+def test_parse_fixture():
+    symbols = fixtureSymbols()
+    assert len(symbols) == 30
+    assert symbols[:2] == ['BTC-USD', 'ETH-USD']
+
+
+def test_pages_and_cache(tmp_path):
+    cache = str(tmp_path / 'universe.json')
+    assert FileUniverse(FIXTURE, cache, page_size=10).load(25) == fixtureSymbols()[:25]
+
+    #within the TTL the cache answers without reading the page
+    loader = FileUniverse(str(tmp_path / 'missing.html'), cache, page_size=10)
+    assert loader.load(25) == fixtureSymbols()[:25]
+
+
+def test_short_universe_is_complete(tmp_path):
+    cache = str(tmp_path / 'universe.json')
+    assert FileUniverse(FIXTURE, cache, page_size=20).load(50) == fixtureSymbols()
+    #the screener lists fewer symbols than asked, nothing more to fetch
+    assert FileUniverse(str(tmp_path / 'missing.html'), cache, page_size=20).load(50) == fixtureSymbols()
+
+
+def test_page_without_table_is_not_cached(tmp_path):
+    cache = str(tmp_path / 'universe.json')
+    with pytest.raises(ValueError):
+        UniverseLoader('https://example.com/cryptocurrencies', cache, Session(CONSENT)).load(50)
+    assert not os.path.exists(cache)
+
+    #the next load asks the screener again
+    with open(FIXTURE) as f:
+        session = Session(f.read())
+    assert UniverseLoader('https://example.com/cryptocurrencies', cache, session).load(50) == fixtureSymbols()
+    assert session.calls == 1
+
+
+def test_empty_universe_is_not_cached(tmp_path):
+    cache = str(tmp_path / 'universe.json')
+    empty = '<table class="W(100%) "><tr><th>Symbol</th></tr></table>'
+    with pytest.raises(ValueError):
+        UniverseLoader('https://example.com/cryptocurrencies', cache, Session(empty)).load(50)
+    assert not os.path.exists(cache)
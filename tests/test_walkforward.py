@@ -0,0 +1,17 @@
+from benchmark import syntheticData
+from sweep import makeGrid
+from walkforward import TRAIN, walkForward, windows
+
+GRID = makeGrid(fast=(10, 20), slow=(50,), window=(20,), width=(0.5,), period=(14,), low=(30,), high=(70,))
+
+
+def test_short_history_is_skipped():
+    frames = {'OLD-USD': syntheticData(TRAIN + 400, seed=0), 'NEW-USD': syntheticData(300, seed=1)}
+    table = walkForward(frames, GRID, workers=2)
+    assert set(table['ticker']) == {'OLD-USD'}
+    assert len(table) == len(windows(TRAIN + 400)) * len(GRID)
+
+
+def test_only_short_histories():
+    table = walkForward({'NEW-USD': syntheticData(TRAIN, seed=1)}, GRID, workers=2)
+    assert table.empty
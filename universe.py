@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import time
+
+import lxml.html
+import requests
+
+logger = logging.getLogger(__name__)
+
+#symbols asked per page of the screener and seconds a saved universe is reused
+PAGE_SIZE = 100
+TTL = 24 * 3600
+
+#first cell of the rows of the quotes table, the header row is skipped like
+#in the original BeautifulSoup version
+TABLE_XPATH = '//table[contains(concat(" ", normalize-space(@class), " "), " W(100%) ")]'
+
+
+def parseSymbols(html):
+    # symbols of a screener page, lxml only builds the tree and the XPath
+    # goes straight to the table instead of walking the whole soup. A page
+    # without the table (consent or captcha page) raises a ValueError.
+    tables = lxml.html.fromstring(html).xpath(TABLE_XPATH)
+    if not tables:
+        raise ValueError('no quotes table in the screener page')
+    rows = tables[0].xpath('.//tr')[1:]
+    return [cells[0].text_content() for cells in (row.xpath('./td') for row in rows) if cells]
+
+
+class UniverseLoader:
+    # Symbols of the Yahoo cryptocurrencies screener, most traded first.
+    # The pages are requested with offset / count until enough symbols are
+    # read, and the result is saved in a json cache. Within the TTL the cache
+    # is used without any request; after it each page is asked again with its
+    # ETag / Last-Modified so a page that did not change costs a 304.
+
+    def __init__(self, url, cache_path, session=None, ttl=TTL, page_size=PAGE_SIZE):
+
+        self.url = url
+        self.cache_path = cache_path
+        self.session = session if session is not None else requests.Session()
+        self.ttl = ttl
+        self.page_size = page_size
+
+    def loadCache(self):
+        if not os.path.exists(self.cache_path):
+            return {'fetched': 0, 'complete': False, 'pages': {}}
+        with open(self.cache_path) as f:
+            return json.load(f)
+
+    def saveCache(self, cache):
+        tmp = self.cache_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp, self.cache_path)
+
+    def fetchPage(self, offset, cached):
+        # (symbols, validators) of the page at offset, cached ones on a 304
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        resp = self.session.get(self.url, params={'offset': offset, 'count': self.page_size}, headers=headers)
+        if resp.status_code == 304:
+            return cached['symbols'], cached
+        resp.raise_for_status()
+        validators = {'etag': resp.headers.get('ETag'), 'last_modified': resp.headers.get('Last-Modified')}
+        return parseSymbols(resp.text), validators
+
+    @staticmethod
+    def symbols(cache):
+        pages = sorted(cache['pages'].items(), key=lambda item: int(item[0]))
+        return [symbol for _, page in pages for symbol in page['symbols']]
+
+    def load(self, count=50):
+        # the first count symbols (fewer when the screener lists fewer), an
+    # empty universe raises a ValueError and is not cached
+        cache = self.loadCache()
+        cached = self.symbols(cache)
+        if time.time() - cache['fetched'] < self.ttl and (len(cached) >= count or cache['complete']):
+            return cached[:count]
+
+        pages = {}
+        complete = False
+        for offset in range(0, count, self.page_size):
+            previous = cache['pages'].get(str(offset), {})
+            symbols, validators = self.fetchPage(offset, previous)
+            pages[str(offset)] = dict(validators, symbols=symbols)
+            if len(symbols) < self.page_size:
+                complete = True
+                break
+        total = sum(len(p['symbols']) for p in pages.values())
+        if not total:
+            raise ValueError(f'no symbols in the screener page {self.url}')
+        logger.info('universe of %d symbols refreshed', total)
+        cache = {'fetched': time.time(), 'complete': complete, 'pages': pages}
+        self.saveCache(cache)
+        return self.symbols(cache)[:count]
+
+
+class FileUniverse(UniverseLoader):
+    # Offline stand-in: pages are cut from a saved screener page (the
+    # fixtures/cryptocurrencies.html file for instance)
+
+    def __init__(self, path, cache_path, ttl=TTL, page_size=PAGE_SIZE):
+        super().__init__(path, cache_path, ttl=ttl, page_size=page_size)
+
+    def fetchPage(self, offset, cached):
+        with open(self.url) as f:
+            symbols = parseSymbols(f.read())
+        return symbols[offset:offset + self.page_size], {}
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from signals import signalState
+from sweep import SharedRolling, conditions, evaluate, makeGrid, sweepTicker
+
+logger = logging.getLogger(__name__)
+
+#bars of the train and test windows, about two years and six months of daily bars
+TRAIN = 730
+TEST = 182
+
+
+def windows(n, train=TRAIN, test=TEST):
+    # (train start, test start, test stop) of the rolling windows over n bars,
+    # each test window follows its train window and they step by test bars
+    return [(start, start + train, min(start + train + test, n))
+            for start in range(0, n - train, test)]
+
+
+def walkForwardTicker(df, grid, bounds):
+    # best parameters of every strategy on each train window and their result
+    # on the following test window. The prefix sums are built once for the
+    # ticker and shared by all its windows, and the bollinger width only uses
+    # the 200 SMA known at the end of the train window.
+
+    rolling = SharedRolling(df['Close'].values)
+    high = df['High'].values.astype(float)
+    low = df['Low'].values.astype(float)
+    dates = df['Date'].values
+
+    rows = []
+    for start, split, stop in bounds:
+        band_std = rolling.smaStd(200, 0, split)
+        train = sweepTicker(df, grid, start, split, rolling, band_std)
+        best = train.loc[train.groupby('strategy', sort=False)['value'].idxmax()]
+        for _, row in best.iterrows():
+            columns = list(grid[row['strategy']].columns)
+            params = pd.DataFrame([row[columns].values], columns=columns).astype(grid[row['strategy']].dtypes)
+            codes = signalState(*conditions(rolling, row['strategy'], params, split, stop, band_std))
+            value, trades = evaluate(codes, high[split:stop], low[split:stop], rolling.close[split:stop])
+            rows.append(dict(strategy=row['strategy'], train_start=dates[start], test_start=dates[split],
+                             test_end=dates[stop - 1], train_value=row['value'], test_value=value[0],
+                             test_trades=trades[0], **params.iloc[0].to_dict()))
+    return pd.DataFrame(rows)
+
+
+def walkForwardWorker(args):
+    ticker, df, grid, bounds = args
+    return walkForwardTicker(df, grid, bounds).assign(ticker=ticker)
+
+
+def walkForward(frames, grid=None, train=TRAIN, test=TEST, workers=None):
+    # out-of-sample results of every window of every ticker. The windows of a
+    # ticker are split in groups when there are fewer tickers than workers so
+    # the process pool stays busy; each group shares one set of prefix sums.
+    # A ticker too short for a single window is left out of the table.
+
+    grid = makeGrid() if grid is None else grid
+    workers = workers if workers is not None else os.cpu_count()
+    groups = max(1, workers // max(len(frames), 1))
+    tasks = []
+    for ticker, df in frames.items():
+        bounds = windows(len(df), train, test)
+        if not bounds:
+            logger.info('%s skipped: %d bars, no window of %d train bars', ticker, len(df), train)
+            continue
+        for part in np.array_split(np.arange(len(bounds)), min(groups, len(bounds))):
+            tasks.append((ticker, df[['Date', 'High', 'Low', 'Close']], grid, [bounds[i] for i in part]))
+
+    if not tasks:
+        return pd.DataFrame()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = [r for r in pool.map(walkForwardWorker, tasks) if len(r)]
+    if not results:
+        return pd.DataFrame()
+
+    table = pd.concat(results, ignore_index=True, sort=False)
+    columns = ['ticker', 'strategy', 'train_start', 'test_start', 'test_end', 'train_value', 'test_value',
+               'test_trades']
+    columns += [c for c in table.columns if c not in columns]
+    return table[columns].sort_values(['ticker', 'strategy', 'test_start']).reset_index(drop=True)
+
+
+def summarize(table):
+    # out-of-sample total of each strategy per ticker, summed over the test
+    # windows like get_returns sums the trades
+    return table.groupby(['ticker', 'strategy']).agg(
+        windows=('test_value', 'size'),
+        test_value=('test_value', 'sum'),
+        test_trades=('test_trades', 'sum'),
+        train_value=('train_value', 'mean'),
+    ).reset_index()